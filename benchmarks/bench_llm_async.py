@@ -0,0 +1,122 @@
+#-------------------------------------------------------------------------------
+#
+#	Compares sequential requests with concurrent, rate-limited ones
+#	against a server that answers 429 above its request rate.
+#
+#	usage: python -m benchmarks.bench_llm_async [calls] [concurrency] [rpm]
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import asyncio
+import os
+import sys
+import tempfile
+
+from time import perf_counter as timer
+
+from .stub_server import StubServer
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# simulated time per request, in seconds
+LATENCY = 0.05
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def create_llm(i):
+	from hansli.llm import LLM
+	return LLM.create("async-%d" % i, "gpt-3.5-turbo@openai.com", use_cache=False,
+		preprompt="autofix")
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def run_sequential(calls):
+	start = timer()
+	for i in range(calls):
+		create_llm(i).chat("call %d" % i)
+	return timer() - start, 0
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def run_concurrent(calls):
+	from hansli.llm import registry
+	async def run():
+		try:
+			return await asyncio.gather(*(create_llm(i).achat("call %d" % i) for i in range(calls)),
+				return_exceptions=True)
+		finally:
+			await registry.close_async_clients()
+	# end function
+	start = timer()
+	results = asyncio.run(run())
+	return timer() - start, sum(isinstance(r, Exception) for r in results)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def measure(name, func, calls, server):
+	from hansli.llm import registry
+	registry.clear()
+	rejected, server.max_active = server.rejected, 0
+	elapsed, failed = func(calls)
+	retried = registry.limiter('openai.com').retried
+	print("%-12s %10.3f %10.1f %10d %10d %10d %10d" % (name, elapsed, calls / elapsed,
+		server.max_active, server.rejected - rejected, retried, failed))
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def main():
+	calls = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+	concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+	rpm = int(sys.argv[3]) if len(sys.argv) > 3 else 120
+	# the settings below must not be saved to the user's configuration, and
+	# contexts saved at exit not to the working directory
+	os.environ['HOME'] = tempfile.mkdtemp(prefix='hansli-bench-home-')
+	os.chdir(os.environ['HOME'])
+	from hansli.config import config
+	config.api_keys['openai.com'] = 'sk-benchmark'
+	with StubServer(latency=LATENCY, rpm=rpm) as server:
+		os.environ['OPENAI_BASE_URL'] = server.base_url
+		print("%-12s %10s %10s %10s %10s %10s %10s" % ("mode", "seconds", "calls/s", "parallel",
+			"429s", "retries", "failed"))
+		# the baseline is not throttled
+		server.rpm = None
+		measure("sequential", run_sequential, calls, server)
+		server.rpm = rpm
+		server.allowance = float(rpm)
+		# without client side limits, the server rejects requests above its rate
+		config.rate_limits = { 'default': { 'concurrency': concurrency } }
+		measure("unlimited", run_concurrent, calls, server)
+		# both sides start with a full burst
+		server.allowance = float(rpm)
+		config.rate_limits = { 'default': { 'concurrency': concurrency, 'rpm': rpm } }
+		measure("limited", run_concurrent, calls, server)
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+# main
+#-------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+	main()
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -0,0 +1,77 @@
+#-------------------------------------------------------------------------------
+#
+#	Compares per-call setup cost of fresh vs. pooled LLM clients.
+#
+#	usage: python -m benchmarks.bench_llm_client [calls]
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import os
+import sys
+import tempfile
+
+from time import perf_counter as timer
+
+from .stub_server import StubServer
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def run(server, calls, pooled):
+	from hansli.config import config
+	from hansli.llm import LLM
+	from hansli.llm import registry
+
+	config.api_keys['openai.com'] = 'sk-benchmark'
+	registry.clear()
+	connections = server.connections
+	start = timer()
+	for i in range(calls):
+		if not pooled:
+			registry.clear()
+		llm = LLM.create("autofix", "gpt-3.5-turbo@openai.com", use_cache=False)
+		llm.chat("call %d" % i)
+	# end for
+	elapsed = timer() - start
+	return elapsed / calls, server.connections - connections
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def main():
+	calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+	# contexts are saved to the working directory
+	os.chdir(tempfile.mkdtemp(prefix='hansli-bench-'))
+	with StubServer() as server:
+		os.environ['OPENAI_BASE_URL'] = server.base_url
+		# warm up imports
+		run(server, 1, True)
+		fresh, fresh_conns = run(server, calls, False)
+		pooled, pooled_conns = run(server, calls, True)
+	# end with
+	print("%-8s %12s %12s" % ("client", "ms/call", "connections"))
+	print("%-8s %12.3f %12d" % ("fresh", fresh * 1000, fresh_conns))
+	print("%-8s %12.3f %12d" % ("pooled", pooled * 1000, pooled_conns))
+	print("saved per call: %.3f ms" % ((fresh - pooled) * 1000))
+# end function
+
+#-------------------------------------------------------------------------------
+# main
+#-------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+	main()
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -0,0 +1,443 @@
+#-------------------------------------------------------------------------------
+#
+#	Benchmarks the stages of the hansli pipeline and writes the results
+#	as JSON, so that they can be compared across commits.
+#
+#	usage: python -m benchmarks.bench_pipeline [-o results.json]
+#	           [--compare baseline.json] [--runs N] [names...]
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from time import perf_counter as timer
+
+from .stub_server import StubServer
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# format of the result files, increased on incompatible changes
+RESULTS_VERSION = 1
+
+# relative slowdown reported as regression when comparing
+DEFAULT_TOLERANCE = 0.10
+
+# steps in the chain measured by the executor benchmark
+CHAIN_LENGTH = 8
+
+EXECUTOR_CONFIG = """
+commands:
+%s
+  check:
+    shell: grep -q fixed %%(input)s
+"""
+
+# reply of the fake LLM backend in the end-to-end benchmark
+AUTOFIX_REPLY = """# Analysis
+The marker is missing.
+# Patched file: %s
+```
+<<<<<<< SEARCH
+broken
+=======
+fixed
+>>>>>>> REPLACE
+```
+"""
+
+#-------------------------------------------------------------------------------
+# benchmark registry
+#-------------------------------------------------------------------------------
+#
+BENCHMARKS = {}
+
+def benchmark(name, unit=None):
+	# registers a function that prepares a benchmark. it returns the function
+	# to measure, and optionally the amount of data processed per call
+	def register(func):
+		BENCHMARKS[name] = (func, unit)
+		return func
+	# end function
+	return register
+# end function
+
+#-------------------------------------------------------------------------------
+# benchmarks
+#-------------------------------------------------------------------------------
+#
+@benchmark('executor_step')
+def bench_executor_step(workdir, settings=''):
+	from hansli.executor import Executor
+	# a chain of commands that do nothing, so that only our overhead remains
+	commands = ''.join("  s%d:\n    shell: 'true'\n%s" % (i,
+		"    requires: s%d\n" % (i - 1) if i else '') for i in range(CHAIN_LENGTH))
+	config_file = os.path.join(workdir, 'executor.yml')
+	with open(config_file, 'w') as out:
+		out.write(settings + EXECUTOR_CONFIG % commands)
+	input = os.path.join(workdir, 'step.txt')
+	with open(input, 'w') as out:
+		out.write('fixed\n')
+	executor = Executor(config_file, use_cache=False)
+	command = 's%d' % (CHAIN_LENGTH - 1)
+	# time per step
+	return lambda: executor.execute(command, input), None, CHAIN_LENGTH
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@benchmark('executor_step_workers')
+def bench_executor_step_workers(workdir):
+	return bench_executor_step(workdir, "workers: true\n")
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@benchmark('capture', unit='MB')
+def bench_capture(workdir):
+	from hansli.capture import OutputCapture, CHUNK_SIZE
+	line = b"src/module.cpp:42:17: warning: unused variable 'x' [-Wunused-variable]\n"
+	data = line * (64 * 1024 * 1024 // len(line))
+	chunks = [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+	def run():
+		# chunks as read from the pipe of a command
+		capture = OutputCapture()
+		for chunk in chunks:
+			capture.feed(chunk)
+		capture.close()
+		return capture.text
+	# end function
+	return run, len(data) / 1e6, 1
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@benchmark('report', unit='MB')
+def bench_report(workdir):
+	from hansli.report import Report, COMMAND
+	source = os.path.join(workdir, 'large.cpp')
+	with open(source, 'w') as out:
+		out.write(''.join("int function_%d(int x) { return x * %d; }\n" % (i, i) for i in range(100000)))
+	output = ''.join("large.cpp:%d:1: error: something went wrong\n" % i for i in range(100000))
+	def run():
+		report = Report()
+		report.append_block("g++ large.cpp -o large\n", title="build command", lang='sh', kind=COMMAND)
+		report.append_block(output, title="build output", lang='sh')
+		report.append_file(source, label="build input")
+		return report.render(16000)
+	# end function
+	return run, (os.path.getsize(source) + len(output)) / 1e6, 1
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@benchmark('report_excerpt', unit='MB')
+def bench_report_excerpt(workdir):
+	from hansli.report import Report
+	source = os.path.join(workdir, 'large.cpp')
+	with open(source, 'w') as out:
+		out.write(''.join("int function_%d(int x) { return x * %d; }\n" % (i, i) for i in range(100000)))
+	def run():
+		# a file with diagnostics near its start and end
+		report = Report()
+		report.append_file(source, label="build input", lines={ 42, 99000 })
+		return report.render(16000)
+	# end function
+	return run, os.path.getsize(source) / 1e6, 1
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@benchmark('extract_code_blocks', unit='MB')
+def bench_extract_code_blocks(workdir):
+	from hansli import utils
+	block = ''.join("    value_%d = compute(value_%d);\n" % (i, i - 1) for i in range(2000))
+	reply = "# Analysis\nMany files changed.\n" + ''.join(
+		"# Corrected file: src/file_%d.cpp\n```cpp\n%s```\nSome explanation.\n" % (i, block)
+		for i in range(50))
+	return lambda: utils.extract_code_blocks(reply, "Corrected file"), len(reply) / 1e6, 1
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def create_history(workdir, messages):
+	from hansli.context import Context
+	ctx = Context(os.path.join(workdir, 'history'))
+	for i in range(messages):
+		ctx.messages.append({ 'role': 'user' if i % 2 else 'assistant',
+			'content': "message %d with some text to make it realistic\n" % i * 10 })
+	ctx.save()
+	return ctx
+# end function
+
+@benchmark('persistent_load')
+def bench_persistent_load(workdir):
+	ctx = create_history(workdir, 10000)
+	# keep some changes in the journal, as after a typical session
+	for i in range(100):
+		ctx.messages.append({ 'role': 'user', 'content': "journaled %d" % i })
+		ctx.save()
+	# end for
+	return ctx.load, None, 1
+# end function
+
+@benchmark('persistent_save')
+def bench_persistent_save(workdir):
+	ctx = create_history(workdir, 10000)
+	def run():
+		ctx.messages.append({ 'role': 'user', 'content': "one more message" })
+		ctx.save()
+	# end function
+	return run, None, 1
+# end function
+
+@benchmark('persistent_compact')
+def bench_persistent_compact(workdir):
+	ctx = create_history(workdir, 10000)
+	return ctx.compact, None, 1
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@benchmark('autofix')
+def bench_autofix(workdir):
+	from hansli import hansli
+	from hansli.config import get_config
+	from hansli.executor import Executor
+	from hansli.llm import registry
+	from hansli.report import Report
+	from hansli.utils import Failed
+
+	config_file = os.path.join(workdir, 'executor.yml')
+	with open(config_file, 'w') as out:
+		out.write(EXECUTOR_CONFIG % '')
+	input = os.path.join(workdir, 'autofix.txt')
+	server = StubServer(reply=AUTOFIX_REPLY % input).start()
+	os.environ['OPENAI_BASE_URL'] = server.base_url
+	get_config().api_keys['openai.com'] = 'sk-benchmark'
+	registry.clear()
+	executor = Executor(config_file, use_cache=False)
+	args = argparse.Namespace(no_cache=True, fix_format='patch', record=None, replay=None,
+		model=None, attempts=1)
+	def run():
+		with open(input, 'w') as out:
+			out.write('broken\n')
+		report = Report()
+		try:
+			executor.execute('check', input, report)
+		except Failed:
+			hansli.autofix(report, args)
+		executor.execute('check', input)
+	# end function
+	return run, None, 1
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@benchmark('autofix_memory')
+def bench_autofix_memory(workdir):
+	from hansli import memory
+	from hansli.executor import Executor
+	from hansli.report import Report
+	from hansli.utils import Failed
+
+	# signatures are built from the output, so the check needs to print an error
+	config_file = os.path.join(workdir, 'executor.yml')
+	with open(config_file, 'w') as out:
+		out.write("commands:\n  check:\n    shell: \"grep -q fixed %(input)s || "
+			"{ echo 'error: marker missing in %(input)s'; exit 1; }\"\n")
+	input = os.path.join(workdir, 'memory.txt')
+	executor = Executor(config_file, use_cache=False)
+	def fail():
+		with open(input, 'w') as out:
+			out.write('broken\n')
+		report = Report()
+		try:
+			executor.execute('check', input, report, quiet=True)
+		except Failed:
+			return memory.Failure(report)
+		raise Failed("check did not fail")
+	# end function
+	# remember the fix once, as if a model had made it
+	failure = fail()
+	with open(input, 'w') as out:
+		out.write('fixed\n')
+	failure.remember()
+	def run():
+		if not fail().recall(executor, 'check', input):
+			raise Failed("no known fix applied")
+		executor.execute('check', input)
+	# end function
+	return run, None, 1
+# end function
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def measure(name, runs):
+	func, unit = BENCHMARKS[name]
+	# each benchmark gets its own directory, as contexts and
+	# scripts are written to the working directory
+	workdir = tempfile.mkdtemp(prefix='hansli-bench-%s-' % name)
+	cwd = os.getcwd()
+	os.chdir(workdir)
+	try:
+		run, amount, count = func(workdir)
+		# warm up caches and imports
+		quietly(run)
+		times = []
+		for _ in range(runs):
+			start = timer()
+			quietly(run)
+			times.append((timer() - start) / count)
+		# end for
+	finally:
+		os.chdir(cwd)
+	# end try
+	result = {
+		'median': statistics.median(times),
+		'min': min(times),
+		'runs': runs,
+	}
+	if unit:
+		result['throughput'] = amount / result['median']
+		result['unit'] = unit + '/s'
+	# end if
+	return result
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def quietly(func):
+	# do not let the output of commands and markdown rendering distort the results
+	from hansli import utils
+	stdout = sys.stdout
+	devnull = open(os.devnull, 'w')
+	console = utils.get_console()
+	console_file = console.file
+	sys.stdout = console.file = devnull
+	try:
+		func()
+	finally:
+		sys.stdout = stdout
+		console.file = console_file
+		devnull.close()
+	# end try
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def environment():
+	try:
+		commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], check=True,
+			cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		commit = None
+	return {
+		'commit': commit,
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'machine': platform.machine(),
+	}
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def compare(results, baseline, tolerance):
+	# prints the change against a previous run, returns the regressions
+	regressions = []
+	print()
+	print("%-22s %12s %12s %9s" % ("benchmark", "baseline ms", "current ms", "change"))
+	for name, result in results.items():
+		old = baseline['results'].get(name)
+		if not old:
+			continue
+		change = result['median'] / old['median'] - 1
+		flag = ''
+		if change > tolerance:
+			flag = '  REGRESSION'
+			regressions.append(name)
+		# end if
+		print("%-22s %12.3f %12.3f %+8.1f%%%s" % (name, old['median'] * 1000,
+			result['median'] * 1000, change * 100, flag))
+	# end for
+	return regressions
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the stages of the hansli pipeline.")
+	parser.add_argument('names', nargs='*', help="benchmarks to run (default: all)")
+	parser.add_argument('-o', '--output', help="write the results to this JSON file")
+	parser.add_argument('--compare', metavar='FILE', help="compare with the results of a previous run")
+	parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+		help="relative slowdown reported as regression (default: %(default)s)")
+	parser.add_argument('--runs', type=int, default=5, help="measurements per benchmark")
+	args = parser.parse_args()
+
+	names = args.names or list(BENCHMARKS)
+	unknown = [name for name in names if name not in BENCHMARKS]
+	if unknown:
+		parser.error("unknown benchmarks: %s (available: %s)" % (', '.join(unknown), ', '.join(BENCHMARKS)))
+
+	output_file = args.output and os.path.abspath(args.output)
+	baseline_file = args.compare and os.path.abspath(args.compare)
+	# keep the user's configuration and caches out of the measurements, and
+	# contexts saved at exit out of the working directory
+	os.environ['HOME'] = tempfile.mkdtemp(prefix='hansli-bench-home-')
+	os.chdir(os.environ['HOME'])
+
+	results = {}
+	print("%-22s %12s %12s %14s" % ("benchmark", "median ms", "min ms", "throughput"))
+	for name in names:
+		result = measure(name, args.runs)
+		results[name] = result
+		throughput = "%.1f %s" % (result['throughput'], result['unit']) if 'unit' in result else ''
+		print("%-22s %12.3f %12.3f %14s" % (name, result['median'] * 1000, result['min'] * 1000, throughput))
+	# end for
+
+	output = { 'version': RESULTS_VERSION }
+	output.update(environment())
+	output['results'] = results
+	if output_file:
+		with open(output_file, 'w') as out:
+			json.dump(output, out, indent=2)
+	# end if
+
+	if baseline_file:
+		with open(baseline_file, 'r') as inp:
+			baseline = json.load(inp)
+		if compare(results, baseline, args.tolerance):
+			sys.exit(1)
+	# end if
+# end function
+
+#-------------------------------------------------------------------------------
+# main
+#-------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+	main()
+
+#-------------------------------------------------------------------------------
+# end of file
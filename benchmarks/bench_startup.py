@@ -0,0 +1,89 @@
+#-------------------------------------------------------------------------------
+#
+#	Measures the import time of the hansli command line tool and fails
+#	if it exceeds a threshold or pulls in heavy modules eagerly.
+#
+#	usage: python -m benchmarks.bench_startup [threshold_ms] [runs]
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import statistics
+import subprocess
+import sys
+
+from time import perf_counter as timer
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# maximum import overhead compared to a bare interpreter, in milliseconds
+DEFAULT_THRESHOLD = 80
+
+# modules that must only be loaded by code paths that need them
+LAZY_MODULES = ['rich', 'yaml', 'openai', 'importlib.metadata', 'hansli.llm',
+	'hansli.blocks', 'hansli.cascade', 'hansli.metrics', 'hansli.patch', 'hansli.watch',
+	'hansli.scheduler', 'difflib', 'mmap']
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def measure(code, runs):
+	times = []
+	for _ in range(runs):
+		start = timer()
+		subprocess.run([sys.executable, '-c', code], check=True)
+		times.append(timer() - start)
+	# end for
+	return statistics.median(times)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def main():
+	threshold = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THRESHOLD
+	runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+	# check for eagerly loaded modules
+	code = "import sys, hansli.hansli; print(' '.join(m for m in %r if m in sys.modules))" % LAZY_MODULES
+	eager = subprocess.run([sys.executable, '-c', code], check=True,
+		capture_output=True, text=True).stdout.split()
+
+	baseline = measure("pass", runs)
+	startup = measure("import hansli.hansli", runs)
+	overhead = (startup - baseline) * 1000
+	print("interpreter: %8.1f ms" % (baseline * 1000))
+	print("hansli:      %8.1f ms" % (startup * 1000))
+	print("overhead:    %8.1f ms (threshold %.1f ms)" % (overhead, threshold))
+
+	failed = False
+	if eager:
+		print("FAILED: modules loaded at startup: %s" % ', '.join(eager))
+		failed = True
+	if overhead > threshold:
+		print("FAILED: startup overhead exceeds threshold")
+		failed = True
+	# end if
+	sys.exit(1 if failed else 0)
+# end function
+
+#-------------------------------------------------------------------------------
+# main
+#-------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+	main()
+
+#-------------------------------------------------------------------------------
+# end of file
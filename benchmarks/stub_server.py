@@ -0,0 +1,186 @@
+#-------------------------------------------------------------------------------
+#
+#	Local stand-in for the OpenAI chat completions API.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class StubServer(ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, reply="# Analysis\nnothing to do\n", latency=0.0, rpm=None, failures=0, replies=None):
+		super().__init__(('127.0.0.1', 0), StubHandler)
+		self.reply = reply
+		# replies of particular models, others get the default one
+		self.replies = replies or {}
+		self.latency = latency
+		# requests per minute accepted before answering 429, like a real provider
+		self.rpm = rpm
+		self.allowance = float(rpm or 0)
+		self.updated = time.monotonic()
+		# number of requests to fail with a server error first
+		self.failures = failures
+		self.connections = 0
+		self.requests = 0
+		self.rejected = 0
+		self.failed = 0
+		# requests in progress, and their maximum
+		self.active = 0
+		self.max_active = 0
+		self.lock = threading.Lock()
+		self.thread = None
+	# end function
+
+	def admit(self):
+		# returns the HTTP status for the next request
+		with self.lock:
+			if self.failures > self.failed:
+				self.failed += 1
+				return 500
+			if self.rpm:
+				now = time.monotonic()
+				self.allowance = min(self.rpm, self.allowance + (now - self.updated) * self.rpm / 60.0)
+				self.updated = now
+				if self.allowance < 1:
+					self.rejected += 1
+					return 429
+				self.allowance -= 1
+			# end if
+			return 200
+		# end with
+	# end function
+
+	@property
+	def base_url(self):
+		return "http://127.0.0.1:%d/v1" % self.server_address[1]
+	# end function
+
+	def start(self):
+		self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+	# end function
+
+	def stop(self):
+		self.shutdown()
+		self.server_close()
+	# end function
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class StubHandler(BaseHTTPRequestHandler):
+	# keep connections alive
+	protocol_version = 'HTTP/1.1'
+	disable_nagle_algorithm = True
+
+	def setup(self):
+		super().setup()
+		with self.server.lock:
+			self.server.connections += 1
+	# end function
+
+	def log_message(self, *args):
+		pass
+
+	def do_POST(self):
+		request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+		with self.server.lock:
+			self.server.requests += 1
+			self.server.active += 1
+			self.server.max_active = max(self.server.max_active, self.server.active)
+		# end with
+		try:
+			self.answer(request)
+		except (BrokenPipeError, ConnectionResetError):
+			# the client cancelled the request
+			pass
+		finally:
+			with self.server.lock:
+				self.server.active -= 1
+		# end try
+	# end function
+
+	def answer(self, request):
+		status = self.server.admit()
+		if status != 200:
+			body = json.dumps({ 'error': { 'message': "stub error %d" % status, 'type': 'stub',
+				'code': None, 'param': None } }).encode()
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(body)))
+			if status == 429:
+				self.send_header('Retry-After', '1')
+			self.end_headers()
+			self.wfile.write(body)
+			return
+		# end if
+		if self.server.latency:
+			time.sleep(self.server.latency)
+		n = request.get('n', 1)
+		usage = { 'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15 }
+		if request.get('stream'):
+			self.send_stream(request, usage)
+			return
+		body = json.dumps({
+			'id': 'stub', 'object': 'chat.completion', 'created': 0, 'model': request['model'],
+			'choices': [{ 'index': i, 'finish_reason': 'stop',
+				'message': { 'role': 'assistant', 'content': self.server.replies.get(request['model'], self.server.reply) } }
+				for i in range(n)],
+			'usage': usage,
+		}).encode()
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+	# end function
+
+	def send_stream(self, request, usage):
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/event-stream')
+		self.send_header('Transfer-Encoding', 'chunked')
+		self.end_headers()
+		def send(data):
+			event = ("data: %s\n\n" % data).encode()
+			self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+		# end function
+		for line in self.server.replies.get(request['model'], self.server.reply).splitlines(keepends=True):
+			send(json.dumps({ 'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub',
+				'choices': [{ 'index': 0, 'delta': { 'role': 'assistant', 'content': line }, 'finish_reason': None }] }))
+		send(json.dumps({ 'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub',
+			'choices': [], 'usage': usage }))
+		send('[DONE]')
+		self.wfile.write(b"0\r\n\r\n")
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
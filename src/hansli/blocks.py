@@ -0,0 +1,171 @@
+#-------------------------------------------------------------------------------
+#
+#	Extracts labeled code blocks from markdown replies while they stream in.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import re
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# parser states
+OUTSIDE = 'outside'
+IN_BLOCK = 'in_block'
+SKIP_BLOCK = 'skip_block'
+
+# opening fence of a code block, with optional info string
+FENCE_PATTERN = re.compile(r"^[ \t]*(`{3,}|~{3,})(.*)$")
+
+# explanations after a filename, like "hello.cpp (fixed loop)" or "hello.cpp - fixed loop"
+TRAILING_PATTERN = re.compile(r"\s+(\(.*\)|[-:–—]\s.*)$")
+
+# filename in backticks, quotes or bold
+QUOTED_PATTERN = re.compile(r"^(`+|\*\*|\"|')(.+?)\1")
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class CodeBlockParser:
+	# finds code blocks preceded by a heading "# <label>: <filename>". processes
+	# each line once, so it runs in linear time however the reply is split up
+	def __init__(self, labels):
+		self.heading = re.compile(r"^#+[ \t]*(%s):[ \t]*(.*)$" % '|'.join(re.escape(l) for l in labels))
+		self.state = OUTSIDE
+		# parts of the current line, until its end arrives
+		self.pending = []
+		self.fence = None
+		self.label = None
+		self.filename = None
+		self.lines = []
+	# end function
+
+	def feed(self, chunk):
+		# returns the blocks completed by this chunk as (label, filename, content)
+		blocks = []
+		start = 0
+		while start < len(chunk):
+			if self.state != OUTSIDE and not self.pending:
+				# only lines containing the fence can end a block, take all lines before at once
+				pos = chunk.find(self.fence, start)
+				end = chunk.rfind('\n', start, pos if pos >= 0 else len(chunk))
+				if end >= 0:
+					if self.state == IN_BLOCK:
+						self.lines.append(chunk[start:end + 1])
+					start = end + 1
+				# end if
+			# end if
+			end = chunk.find('\n', start)
+			if end < 0:
+				self.pending.append(chunk[start:])
+				break
+			# end if
+			self.pending.append(chunk[start:end + 1])
+			self.parse_line(''.join(self.pending), blocks)
+			self.pending = []
+			start = end + 1
+		# end while
+		return blocks
+	# end function
+
+	def close(self):
+		# returns the blocks completed by the last line. blocks that are
+		# still open are dropped, as the reply was probably truncated
+		blocks = []
+		if self.pending:
+			self.parse_line(''.join(self.pending), blocks)
+			self.pending = []
+		# end if
+		return blocks
+	# end function
+
+	def parse_line(self, line, blocks):
+		text = line.rstrip('\r\n')
+		if self.state == IN_BLOCK:
+			if self.is_closing(text):
+				blocks.append(self.finish())
+			elif text.rstrip().endswith(self.fence):
+				# closing fence right after the last line, like "}```"
+				self.lines.append(text.rstrip()[:-len(self.fence)])
+				blocks.append(self.finish())
+			else:
+				self.lines.append(line)
+			# end if
+			return
+		# end if
+		if self.state == SKIP_BLOCK:
+			# code blocks without heading, whose content must not be mistaken for one
+			if self.is_closing(text):
+				self.state = OUTSIDE
+			return
+		# end if
+		m = FENCE_PATTERN.match(text)
+		if m:
+			self.fence = m.group(1)
+			self.state = IN_BLOCK if self.filename else SKIP_BLOCK
+			return
+		# end if
+		m = self.heading.match(text)
+		if m:
+			self.label = m.group(1)
+			self.filename = clean_filename(m.group(2))
+		# end if
+	# end function
+
+	def is_closing(self, text):
+		# at least as many fence characters as the opening fence, and nothing else
+		s = text.strip()
+		return len(s) >= len(self.fence) and s == self.fence[0] * len(s)
+	# end function
+
+	def finish(self):
+		block = (self.label, self.filename, ''.join(self.lines))
+		self.state = OUTSIDE
+		self.label = None
+		self.filename = None
+		self.lines = []
+		return block
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def clean_filename(text):
+	text = text.strip()
+	m = QUOTED_PATTERN.match(text)
+	if m:
+		return m.group(2).strip()
+	return TRAILING_PATTERN.sub('', text).strip()
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def tee(chunks, parser, on_block):
+	# passes chunks through, calling on_block(label, filename, content)
+	# for each block as soon as it is complete
+	for chunk in chunks:
+		yield chunk
+		for block in parser.feed(chunk):
+			on_block(*block)
+	# end for
+	for block in parser.close():
+		on_block(*block)
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -0,0 +1,263 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import contextlib
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import tempfile
+import time
+
+from . import utils
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# file marking a complete cache entry. its mtime is the creation time,
+# whereas the mtime of the entry directory is the time of last access
+META_FILE = '.meta'
+
+# file names inside an artifact cache entry
+ARTIFACT_FILE = 'artifact'
+OUTPUT_FILE = 'output.txt'
+
+# file name inside a response cache entry
+REPLY_FILE = 'reply.json'
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class DiskCache:
+	def __init__(self, dirname, max_size, ttl=None):
+		self.dirname = dirname
+		self.max_size = max_size
+		self.ttl = ttl
+		os.makedirs(self.dirname, exist_ok=True)
+	# end function
+
+	def path(self, key):
+		return os.path.join(self.dirname, key)
+	# end function
+
+	def get(self, key):
+		entry = self.path(key)
+		try:
+			created = os.path.getmtime(os.path.join(entry, META_FILE))
+		except FileNotFoundError:
+			return None
+		if self.ttl is not None and time.time() - created > self.ttl:
+			shutil.rmtree(entry, ignore_errors=True)
+			return None
+		# end if
+		# mark as recently used
+		os.utime(entry)
+		return entry
+	# end function
+
+	@contextlib.contextmanager
+	def store(self, key):
+		# fill a temporary directory and move it into place when done,
+		# so that concurrent readers never see incomplete entries
+		tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.dirname)
+		try:
+			yield tmp
+			with open(os.path.join(tmp, META_FILE), 'w'):
+				pass
+			entry = self.path(key)
+			shutil.rmtree(entry, ignore_errors=True)
+			try:
+				os.rename(tmp, entry)
+			except OSError:
+				# stored concurrently by someone else
+				shutil.rmtree(tmp, ignore_errors=True)
+		except BaseException:
+			shutil.rmtree(tmp, ignore_errors=True)
+			raise
+		# end try
+		self.evict()
+	# end function
+
+	def evict(self):
+		entries = []
+		total = 0
+		for name in os.listdir(self.dirname):
+			if name.startswith('.'):
+				continue
+			entry = self.path(name)
+			try:
+				size = dir_size(entry)
+				entries.append((os.path.getmtime(entry), size, entry))
+			except FileNotFoundError:
+				continue
+			total += size
+		# end for
+		# drop least recently used entries first
+		entries.sort()
+		for _, size, entry in entries:
+			if total <= self.max_size:
+				break
+			shutil.rmtree(entry, ignore_errors=True)
+			total -= size
+		# end for
+	# end function
+
+	def clear(self):
+		shutil.rmtree(self.dirname, ignore_errors=True)
+		os.makedirs(self.dirname, exist_ok=True)
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class ArtifactCache(DiskCache):
+
+	def key(self, command, inputs, shell_file, dependencies=()):
+		h = hashlib.sha256()
+		h.update(command.encode())
+		for filename in inputs + [shell_file]:
+			h.update(b'\0')
+			with open(filename, 'rb') as inp:
+				h.update(inp.read())
+		# end for
+		# other files read by the tool, like headers. named, as adding or removing one matters too
+		for filename in dependencies:
+			h.update(b'\0')
+			h.update(os.path.basename(filename).encode())
+			h.update(b'\0')
+			with open(filename, 'rb') as inp:
+				h.update(inp.read())
+		# end for
+		h.update(b'\0')
+		h.update(tool_identity(shell_file).encode())
+		return h.hexdigest()
+	# end function
+
+	def restore(self, key, output):
+		entry = self.get(key)
+		if not entry:
+			return None
+		artifact = os.path.join(entry, ARTIFACT_FILE)
+		if os.path.exists(artifact):
+			shutil.copy2(artifact, output)
+		with open(os.path.join(entry, OUTPUT_FILE), 'r') as inp:
+			return inp.read()
+	# end function
+
+	def save(self, key, output, captured_output):
+		with self.store(key) as tmp:
+			if os.path.isfile(output):
+				shutil.copy2(output, os.path.join(tmp, ARTIFACT_FILE))
+			with open(os.path.join(tmp, OUTPUT_FILE), 'w') as out:
+				out.write(captured_output)
+		# end with
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class ResponseCache(DiskCache):
+
+	def key(self, model_id, messages):
+		return request_key(model_id, messages)
+	# end function
+
+	def lookup(self, key):
+		entry = self.get(key)
+		if not entry:
+			return None
+		with open(os.path.join(entry, REPLY_FILE), 'r') as inp:
+			data = json.load(inp)
+		return data['reply'], data['usage']
+	# end function
+
+	def save(self, key, reply, usage):
+		with self.store(key) as tmp:
+			with open(os.path.join(tmp, REPLY_FILE), 'w') as out:
+				json.dump({ 'reply': reply, 'usage': usage }, out)
+		# end with
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# helpers
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+#
+def dir_size(dirname):
+	size = 0
+	for root, dirs, files in os.walk(dirname):
+		for f in files:
+			size += os.path.getsize(os.path.join(root, f))
+	# end for
+	return size
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def request_key(model_id, messages):
+	# ignore formatting differences that do not change the meaning
+	normalized = [{ 'role': m['role'], 'content': normalize_text(m['content']) } for m in messages]
+	data = json.dumps([model_id, normalized], sort_keys=True)
+	return hashlib.sha256(data.encode()).hexdigest()
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def tool_identity(shell_file):
+	# identify the tool invoked by a shell script (e.g. the compiler)
+	# by its resolved path, size and modification time
+	with open(shell_file, 'r') as inp:
+		try:
+			tokens = shlex.split(inp.read(), comments=True)
+		except ValueError:
+			return ''
+	# end with
+	if not tokens:
+		return ''
+	tool = tokens[0]
+	if os.sep in tool:
+		tool = os.path.join(os.path.dirname(shell_file), tool)
+	else:
+		tool = shutil.which(tool) or tool
+	# end if
+	try:
+		st = os.stat(tool)
+	except OSError:
+		return tool
+	return "%s:%d:%d" % (os.path.realpath(tool), st.st_size, st.st_mtime_ns)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def normalize_text(text):
+	lines = text.replace('\r\n', '\n').split('\n')
+	return '\n'.join(line.rstrip() for line in lines).strip()
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def default_dir(name):
+	return os.path.join(utils.OsPaths.APPDATA, 'hansli', name)
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
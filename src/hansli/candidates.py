@@ -0,0 +1,119 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import concurrent.futures
+import os
+import shutil
+import tempfile
+
+from . import patch
+from . import utils
+from .utils import Failed
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Candidate:
+	def __init__(self, index, reply, files):
+		self.index = index
+		self.reply = reply
+		self.files = files
+		self.success = False
+		self.failed_command = None
+	# end function
+
+	def promote(self):
+		# apply the fix to the real working tree
+		for filename, content in self.files:
+			utils.save_file(filename, content)
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def validate(executor, command, input, replies, label):
+	# applies each reply to an isolated copy of the input directory and
+	# re-runs the command there. returns the first candidate that passes
+	candidates = []
+	for i, reply in enumerate(replies):
+		files, failed = patch.resolve_files(reply, label)
+		if files and not failed:
+			candidates.append(Candidate(i, reply, files))
+	# end for
+	return validate_files(executor, command, input, candidates)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def validate_files(executor, command, input, candidates):
+	# see validate, for candidates with files already resolved
+	root = os.path.dirname(os.path.abspath(input))
+	candidates = [c for c in candidates if all(is_inside(f, root) for f, _ in c.files)]
+	if not candidates:
+		return None
+
+	pool = concurrent.futures.ThreadPoolExecutor(max_workers=len(candidates))
+	try:
+		futures = [pool.submit(run_candidate, executor, command, input, root, c) for c in candidates]
+		for future in concurrent.futures.as_completed(futures):
+			candidate = future.result()
+			if candidate.success:
+				return candidate
+		# end for
+		return None
+	finally:
+		# do not wait for the remaining candidates
+		pool.shutdown(wait=False, cancel_futures=True)
+	# end try
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def run_candidate(executor, command, input, root, candidate):
+	scratch = tempfile.mkdtemp(prefix='hansli-candidate-')
+	try:
+		# work on a copy of the input directory
+		copy = os.path.join(scratch, os.path.basename(root))
+		shutil.copytree(root, copy, symlinks=True, ignore=shutil.ignore_patterns('.git'))
+		for filename, content in candidate.files:
+			utils.save_file(os.path.join(copy, os.path.relpath(os.path.abspath(filename), root)), content)
+		# run the command quietly
+		steps, _ = executor.plan(command, [os.path.join(copy, os.path.basename(input))])
+		for step in steps:
+			if not executor.run_step(step, None, print_output=False):
+				candidate.failed_command = step.command
+				return candidate
+		# end for
+		candidate.success = True
+		return candidate
+	except (Failed, OSError):
+		return candidate
+	finally:
+		shutil.rmtree(scratch, ignore_errors=True)
+	# end try
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def is_inside(filename, root):
+	rel = os.path.relpath(os.path.abspath(filename), root)
+	return rel != os.pardir and not rel.startswith(os.pardir + os.sep)
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
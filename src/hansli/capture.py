@@ -0,0 +1,132 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import codecs
+import collections
+import os
+import sys
+
+from . import utils
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# number of bytes to read from the process at once
+CHUNK_SIZE = 64 * 1024
+
+# default number of characters kept from the start and the end of the output
+DEFAULT_HEAD = '64K'
+DEFAULT_TAIL = '256K'
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class OutputCapture:
+	def __init__(self, head=DEFAULT_HEAD, tail=DEFAULT_TAIL, spill_file=None, echo=False, on_text=None):
+		self.head_limit = utils.parse_size(head)
+		self.tail_limit = utils.parse_size(tail)
+		self.spill_file = spill_file
+		self.echo = echo
+		# called with each piece of text after it has been captured
+		self.on_text = on_text
+		self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+		self.head = []
+		self.head_size = 0
+		# ring buffer of chunks, the first one may be partially outdated
+		self.tail = collections.deque()
+		self.tail_size = 0
+		# number of characters dropped between head and tail
+		self.truncated = 0
+		self.spill = open(spill_file, 'w') if spill_file else None
+	# end function
+
+	def read_from(self, stream):
+		fd = stream.fileno()
+		while True:
+			data = os.read(fd, CHUNK_SIZE)
+			if not data:
+				break
+			self.feed(data)
+		# end while
+		self.close()
+	# end function
+
+	def feed(self, data):
+		text = self.decoder.decode(data)
+		if text:
+			self.append(text)
+			if self.on_text:
+				self.on_text(text)
+		# end if
+	# end function
+
+	def close(self):
+		text = self.decoder.decode(b'', final=True)
+		if text:
+			self.append(text)
+		if self.spill:
+			self.spill.close()
+			self.spill = None
+		# end if
+	# end function
+
+	def append(self, text):
+		if self.echo:
+			sys.stdout.write(text)
+			sys.stdout.flush()
+		# end if
+		if self.spill:
+			self.spill.write(text)
+		# fill head first
+		if self.head_size < self.head_limit:
+			part = text[:self.head_limit - self.head_size]
+			self.head.append(part)
+			self.head_size += len(part)
+			text = text[len(part):]
+		# end if
+		if not text:
+			return
+		# keep the rest in the ring buffer
+		self.tail.append(text)
+		self.tail_size += len(text)
+		while self.tail_size > self.tail_limit:
+			excess = self.tail_size - self.tail_limit
+			first = self.tail[0]
+			if len(first) <= excess:
+				self.tail.popleft()
+				dropped = len(first)
+			else:
+				self.tail[0] = first[excess:]
+				dropped = excess
+			# end if
+			self.tail_size -= dropped
+			self.truncated += dropped
+		# end while
+	# end function
+
+	@property
+	def text(self):
+		parts = self.head
+		if self.truncated:
+			parts = parts + ["\n[... %d characters truncated%s ...]\n" % (self.truncated,
+				", see %s" % self.spill_file if self.spill_file else "")]
+		return ''.join(parts) + ''.join(self.tail)
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
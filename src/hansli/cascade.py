@@ -0,0 +1,105 @@
+#-------------------------------------------------------------------------------
+#
+#	Model cascades like "fast@openai.com > strong@openai.com": fixes are
+#	requested from the first model, and only escalated to the next one
+#	if they do not succeed.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import functools
+import os
+
+from . import utils
+from .utils import Failed
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# separates the models of a cascade
+SEPARATOR = '>'
+
+# attempts recorded before a model's statistics are trusted for ordering
+MIN_SAMPLES = 5
+
+# weight of previous statistics when recording an attempt, so that
+# the order adapts when models or the kind of failures change
+DECAY = 0.95
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class ModelStats(utils.Persistent):
+	# success rate and latency of fix attempts per model
+	def __init__(self, name):
+		super().__init__(name)
+		# model -> { 'attempts', 'successes', 'seconds' }, exponentially decayed
+		self.models = {}
+		self.load()
+	# end function
+
+	def record(self, model, success, seconds):
+		s = self.models.setdefault(model, { 'attempts': 0.0, 'successes': 0.0, 'seconds': 0.0 })
+		s['attempts'] = s['attempts'] * DECAY + 1
+		s['successes'] = s['successes'] * DECAY + (1 if success else 0)
+		s['seconds'] = s['seconds'] * DECAY + seconds
+		self.mark_dirty('models')
+	# end function
+
+	def expected_seconds(self, model):
+		# time per attempt divided by the chance of success, None if unknown
+		s = self.models.get(model)
+		if not s or s['attempts'] < MIN_SAMPLES:
+			return None
+		# add one success and one failure, so that a model is never ruled out completely
+		rate = (s['successes'] + 1) / (s['attempts'] + 2)
+		return s['seconds'] / s['attempts'] / rate
+	# end function
+
+	def order(self, models):
+		# the order with the least expected time until a fix succeeds, that is,
+		# by seconds per attempt divided by success rate. as given until all
+		# models have enough statistics, escalations provide them for later ones
+		scores = [self.expected_seconds(m) for m in models]
+		if None in scores:
+			return list(models)
+		return [m for _, m in sorted(zip(scores, models), key=lambda x: x[0])]
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def parse(spec):
+	# "a > b > c" -> ['a', 'b', 'c']
+	models = [m.strip() for m in spec.split(SEPARATOR)]
+	if not all(models):
+		raise Failed("invalid model cascade: '%s'" % spec)
+	return models
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=None)
+def get_stats():
+	# singleton, loaded on first use
+	dirname = os.path.join(utils.OsPaths.APPDATA, 'hansli')
+	os.makedirs(dirname, exist_ok=True)
+	return ModelStats(os.path.join(dirname, 'model_stats'))
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
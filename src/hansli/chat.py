@@ -2,11 +2,17 @@ from rich.console import Console
 from rich.markdown import Markdown
 
 from hansli.llm.llm_openai import LLM_OpenAI
+from hansli import utils
+from hansli.config import get_config
+from hansli.context import SUMMARIZE
 
 console = Console()
 
-#llm = LLM_OpenAI("mychat", "gpt-4-turbo-preview")
-llm = LLM_OpenAI("mychat", "gpt-3.5-turbo")
+#llm = LLM_OpenAI("mychat", "gpt-4-turbo-preview@openai.com")
+llm = LLM_OpenAI("mychat", "gpt-3.5-turbo@openai.com")
+llm.ctx.load()
+# keep per-turn cost flat in long sessions
+llm.ctx.set_strategy(SUMMARIZE, get_config().context.get('max_tokens'))
 
 for msg in llm.ctx.messages:
 	if msg['role'] == 'user':
@@ -22,6 +28,5 @@ while True:
 	user_input = console.input(">> ")
 	if not user_input:
 		break
-	reply = Markdown(llm.chat(user_input))
-	console.print(reply)
+	utils.print_markdown_stream(llm.chat_stream(user_input))
 # end while
@@ -12,6 +12,9 @@
 # imports 
 #-------------------------------------------------------------------------------
 #
+import functools
+
+from . import trace
 from . import utils
 from .utils import Failed
 
@@ -23,20 +26,67 @@ class Config(utils.Persistent):
 	def __init__(self, name):
 		super().__init__(name)
 		self.api_keys = {}
+		# model for fixes and improvements, or a cascade of models to try in turn,
+		# like "fast@openai.com > strong@openai.com"
+		self.model = "gpt-3.5-turbo@openai.com"
+		self.llm_cache = {
+			'max_size': '64M',
+			'ttl': 7 * 24 * 3600, # seconds
+		}
+		# limits of concurrent requests per provider, or 'default' for all others.
+		# rpm/tpm: requests/tokens per minute, None for unlimited
+		self.rate_limits = {
+			'default': { 'concurrency': 8, 'rpm': None, 'tpm': None, 'retries': 5 },
+		}
+		# statistics of each run, shown by "hansli stats"
+		self.metrics = {
+			'enabled': True,
+		}
+		# fixes that succeeded are tried again for similar errors, before asking a model
+		self.fix_memory = {
+			'enabled': True,
+		}
+		# context management: strategy 'full', 'window' or 'summarize'
+		self.context = {
+			'strategy': 'full',
+			'max_tokens': 8000,
+		}
 		self.load()
 	# end function
 		
+	def saved_attrs(self):
+		# only settings loaded or changed, so that the defaults of later versions apply
+		return [a for a in self.attrs() if a in self._stored or a in self._dirty]
+	# end function
+
 	def set_apikey(self, name, value):
 		if value:
 			self.api_keys[name] = value
 		else:
 			del self.api_keys[name]
+		self.mark_dirty('api_keys')
 	# end function	
 
 # end class
 
-# singleton
-config = Config(utils.from_home('.hansli'))
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=None)
+def get_config():
+	# singleton, loaded on first use
+	with trace.span("config load", 'config'):
+		return Config(utils.from_home('.hansli'))
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def __getattr__(name):
+	if name == 'config':
+		return get_config()
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
+# end function
 
 #-------------------------------------------------------------------------------
 # end of file
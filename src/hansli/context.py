@@ -1,12 +1,94 @@
 from . import utils
+from .tokens import count_tokens
+
+# context management strategies
+FULL = 'full'
+WINDOW = 'window'
+SUMMARIZE = 'summarize'
 
 class Context(utils.Persistent):
+	journaled = ('messages',)
+
 	def __init__(self, name):
 		super().__init__(name)
 		self.messages = []
 		self.tokens_input = 0
 		self.tokens_output = 0
-		self.tokens_total = 0	
+		self.tokens_total = 0
+		# replies served from the response cache, and the tokens they saved
+		self.cache_hits = 0
+		self.tokens_cached = 0
+		# prompt tokens not sent thanks to the context strategy
+		self.tokens_saved = 0
+		# prompt tokens served from the provider's prompt cache, as the
+		# conversation so far is sent unchanged with each request
+		self.tokens_prefix_cached = 0
+		# summary of the messages before index 'summarized'
+		self.summary = ""
+		self.summarized = 0
+		# strategy settings are not persisted
+		self._strategy = FULL
+		self._max_tokens = None
+		self._token_counts = []
 		#self.load()
 	# end functions
-# end class
\ No newline at end of file
+
+	def set_strategy(self, strategy, max_tokens=None):
+		self._strategy = strategy
+		self._max_tokens = max_tokens
+	# end function
+
+	def prompt_messages(self, model, summarize=None):
+		# messages to send for the next request
+		if self._strategy == FULL or not self._max_tokens or not self.messages:
+			return self.messages
+		counts = self.count_tokens(model)
+		# always keep the preprompt
+		pinned = 0
+		while pinned < len(self.messages) and self.messages[pinned]['role'] == 'system':
+			pinned += 1
+		# end while
+		budget = self._max_tokens - sum(counts[:pinned])
+		if self._strategy == SUMMARIZE:
+			budget -= count_tokens(self.summary, model)
+		# keep as many recent messages as fit, but at least the last one
+		start = len(self.messages) - 1
+		used = counts[start]
+		while start > pinned and used + counts[start - 1] <= budget:
+			start -= 1
+			used += counts[start]
+		# end while
+		window = self.messages[start:]
+		extra = []
+		if self._strategy == SUMMARIZE and summarize:
+			# fold messages leaving the window into the summary
+			first = max(self.summarized, pinned)
+			if first < start:
+				self.summary = summarize(self.summary, self.messages[first:start])
+				self.summarized = start
+			# end if
+			if self.summary:
+				extra = [{ 'role': 'system', 'content': "Summary of the conversation so far:\n" + self.summary }]
+		# end if
+		saved = sum(counts[pinned:start]) - sum(count_tokens(m['content'], model) for m in extra)
+		self.tokens_saved += max(0, saved)
+		return self.messages[:pinned] + extra + window
+	# end function
+
+	def history_tokens(self, model):
+		# tokens the conversation so far occupies in a request
+		total = sum(self.count_tokens(model))
+		if self._strategy == FULL or not self._max_tokens:
+			return total
+		return min(total, self._max_tokens)
+	# end function
+
+	def count_tokens(self, model):
+		# token counts per message, computed once per message
+		if len(self._token_counts) > len(self.messages):
+			self._token_counts = []
+		for m in self.messages[len(self._token_counts):]:
+			self._token_counts.append(count_tokens(m['content'], model))
+		return self._token_counts
+	# end function
+# end class
@@ -0,0 +1,222 @@
+#-------------------------------------------------------------------------------
+#
+#	Finds source locations in compiler and interpreter output, and
+#	excerpts the referenced files around them.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import bisect
+import os
+import re
+
+from array import array
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# gcc/clang style "file:line:col: error: ...", including include chains
+# like "In file included from file:line:" and "    from file:line,"
+COMPILER_PATTERN = re.compile(
+	r"^(?:In file included from |\s+from )?((?:[A-Za-z]:)?[^\s:][^:\n]*):(\d+)(?::(\d+))?[:,]",
+	re.MULTILINE)
+
+# python tracebacks: File "file", line 42, in function
+TRACEBACK_PATTERN = re.compile(r'^\s*File "([^"\n]+)", line (\d+)', re.MULTILINE)
+
+# files of at least that size are memory-mapped instead of read
+MMAP_THRESHOLD = 1 << 20
+
+# newlines are counted in blocks of that many bytes
+BLOCK_SIZE = 1 << 16
+
+# bytes inspected to tell binary files from text
+BINARY_PROBE_SIZE = 8192
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class LineIndex:
+	# finds lines by the number of newlines per block, counted as far as needed,
+	# so that large files need not be split into lines
+	def __init__(self, filename):
+		self.size = os.path.getsize(filename)
+		with open(filename, 'rb') as inp:
+			if self.size >= MMAP_THRESHOLD:
+				import mmap
+				self.data = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+			else:
+				self.data = inp.read()
+		# end with
+		# newlines before the start of each block
+		self.newlines = array('q', [0])
+	# end function
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def close(self):
+		# data read into memory needs no closing
+		if not isinstance(self.data, bytes):
+			self.data.close()
+	# end function
+
+	def count_blocks(self, newlines):
+		# until the given number of newlines is reached, or the end of the file
+		while self.newlines[-1] < newlines:
+			start = (len(self.newlines) - 1) * BLOCK_SIZE
+			if start >= self.size:
+				return False
+			self.newlines.append(self.newlines[-1] + self.data[start:start + BLOCK_SIZE].count(b'\n'))
+		# end while
+		return True
+	# end function
+
+	def line_start(self, n):
+		# offset of line n (1-based), None if the file has less lines
+		if n == 1:
+			return 0
+		if not self.count_blocks(n - 1):
+			return None
+		# skip the remaining newlines in the block containing the one wanted
+		i = bisect.bisect_left(self.newlines, n - 1) - 1
+		pos = i * BLOCK_SIZE
+		for _ in range(n - 1 - self.newlines[i]):
+			pos = self.data.find(b'\n', pos) + 1
+		return pos if pos < self.size else None
+	# end function
+
+	def line_count(self):
+		self.count_blocks(self.size + 1)
+		if self.size and not self.data[self.size - 1:self.size] == b'\n':
+			return self.newlines[-1] + 1
+		return self.newlines[-1]
+	# end function
+
+	def lines(self, first, last):
+		# text of lines first to last, and the number of the last line included
+		start = self.line_start(first)
+		if start is None:
+			return '', first - 1
+		end = self.line_start(last + 1)
+		if end is None:
+			end = self.size
+			last = self.line_count()
+		# end if
+		return self.data[start:end].decode('utf-8', errors='replace'), last
+	# end function
+
+	def excerpt(self, line_numbers, context):
+		# the given lines with some context each, omitted parts are marked
+		windows = []
+		for n in sorted(line_numbers):
+			first = max(1, n - context)
+			if windows and first <= windows[-1][1] + 1:
+				windows[-1][1] = n + context
+			else:
+				windows.append([first, n + context])
+		# end for
+		parts = []
+		next_line = 1
+		for first, last in windows:
+			text, last = self.lines(first, last)
+			if not text:
+				break
+			if first > next_line:
+				parts.append("[... lines %d-%d omitted ...]\n" % (next_line, first - 1))
+			if not text.endswith('\n'):
+				text += '\n'
+			parts.append(text)
+			next_line = last + 1
+		# end for
+		if self.line_start(next_line) is not None:
+			parts.append("[... lines %d-end omitted ...]\n" % next_line)
+		return ''.join(parts)
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class ErrorScanner:
+	# finds the first line matching one of the given patterns in output
+	# that arrives in pieces, without scanning any line twice
+	def __init__(self, patterns):
+		# without patterns, nothing matches
+		self.pattern = re.compile('|'.join('(?:%s)' % p for p in patterns), re.MULTILINE) if patterns else None
+		# start of the current line, until its end arrives
+		self.pending = ''
+		# text after the matching line
+		self.rest = ''
+	# end function
+
+	def feed(self, text):
+		# returns the first matching line completed by this text, None if there is none
+		if self.pattern is None:
+			return None
+		text = self.pending + text
+		end = text.rfind('\n') + 1
+		self.pending = text[end:]
+		m = self.pattern.search(text, 0, end)
+		if not m:
+			return None
+		start = text.rfind('\n', 0, m.start()) + 1
+		# an empty match may be at the start of the incomplete line
+		stop = text.find('\n', m.start(), end)
+		if stop < 0:
+			return None
+		self.rest = text[stop + 1:]
+		return text[start:stop].strip()
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def parse(output):
+	# returns (filename, line) of all locations mentioned in the output
+	locations = [(m.group(1), int(m.group(2))) for m in COMPILER_PATTERN.finditer(output)]
+	locations += [(m.group(1), int(m.group(2))) for m in TRACEBACK_PATTERN.finditer(output)]
+	return locations
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def locations(output, dirname):
+	# maps the real paths of existing files to the lines mentioned in the output.
+	# relative names are resolved against the directory the command ran in
+	result = {}
+	for filename, line in parse(output):
+		path = os.path.realpath(os.path.join(dirname, filename))
+		if path in result or os.path.isfile(path):
+			result.setdefault(path, set()).add(line)
+	# end for
+	return result
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def is_binary(filename):
+	# text files do not contain null bytes, at least not in their beginning
+	with open(filename, 'rb') as inp:
+		return b'\0' in inp.read(BINARY_PROBE_SIZE)
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
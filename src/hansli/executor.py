@@ -12,117 +12,414 @@
 # imports 
 #-------------------------------------------------------------------------------
 #
+import glob
 import os
+import shlex
 import subprocess
 import sys
 
-import yaml
+from time import perf_counter as timer
 
-from .report import Report
+from .cache import ArtifactCache, default_dir
+from .capture import OutputCapture, DEFAULT_HEAD, DEFAULT_TAIL
+from .report import Report, COMMAND
+from . import diagnostics
+from . import trace
 from . import utils
 from .utils import Failed
 
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# early abort policies: stop the command, or let it finish
+KILL = 'kill'
+CONTINUE = 'continue'
+
+# appended to output cut short by early abort
+KILLED_NOTE = "\n[... stopped after the first fatal error ...]\n"
+RUNNING_NOTE = "\n[... output incomplete, the command is still running ...]\n"
+
 #-------------------------------------------------------------------------------
 # class definition
+#-------------------------------------------------------------------------------
+#
+class Aborted(Exception):
+	# raised while capturing output to stop the process
+	pass
+
 #-------------------------------------------------------------------------------
 #
 class Executor:
-	def __init__(self, config_file, verbose=False):
-		self.config = utils.load_file(config_file)
+	def __init__(self, config_file, verbose=False, use_cache=True, cancellable=False, early_abort=False):
+		with trace.span("executor config load", 'config'):
+			self.config = utils.load_file(config_file)
 		self.verbose = verbose
+		# watch output for fatal errors, see early_abort in the config
+		self.early_abort = None
+		if early_abort:
+			self.early_abort = self.config.get('early_abort') or {}
+			if self.early_abort.get('policy', KILL) not in (KILL, CONTINUE):
+				raise Failed("unknown early abort policy: %s" % self.early_abort['policy'])
+			# an empty pattern would match every line
+			if not self.early_abort.get('patterns'):
+				raise Failed("early abort needs patterns of fatal errors in the config")
+		# end if
+		# called with (error, report) on the first fatal error of an execution,
+		# report being a copy of the given one with the output so far
+		self.on_fatal = None
+		self.fatal_seen = False
+		# fatal error of the step that failed the last execution, as (command, name, line)
+		self.error = None
+		# run processes in their own session, so that cancel() and early abort
+		# can kill them with all children
+		self.cancellable = cancellable or self.policy() == KILL
+		self.running = set()
+		# long-lived shells to run the scripts, if enabled
+		self.workers = None
+		if self.config.get('workers'):
+			from .workers import WorkerPool
+			self.workers = WorkerPool(new_session=self.cancellable)
+		# end if
+		# cache for build artifacts
+		self.cache = None
+		cache_config = self.config.get('cache')
+		if use_cache and cache_config:
+			self.cache = ArtifactCache(cache_config.get('dir') or default_dir('artifacts'),
+				utils.parse_size(cache_config.get('max_size', '256M')))
+		# end if
+	# end function
+
+	def execute(self, command, input, report=None, quiet=False):
+		steps, _ = self.plan(command, [input])
+		self.error = None
+		self.fatal_seen = False
+		for step in steps:
+			# only show output of first command, unless verbose mode is enabled
+			print_output = not quiet and (step.depth == 0 or self.verbose)
+			if not self.run_step(step, report, print_output):
+				if self.early_abort:
+					self.error = self.fatal_error(step, step.captured_output or '')
+				# output it now if not done so far
+				if step.captured_output is not None and not print_output and not quiet:
+					sys.stdout.write(step.captured_output)
+				raise Failed("%s failed with errors. Try again with '--autofix' to correct them automatically." % step.command)
+			# end if
+		# end for
+		# success
+		return steps[-1].output
+	# end function
+
+	def cancel(self):
+		# stop all processes currently running
+		for proc in list(self.running):
+			utils.kill_process(proc, self.cancellable)
 	# end function
 
-	def execute(self, command, input, report=None, depth=0):
+	def policy(self):
+		return self.early_abort.get('policy', KILL) if self.early_abort is not None else None
+	# end function
+
+	def fatal_error(self, step, text):
+		# the first fatal error in the output of a step as (command, name, line), None if there is none
+		line = diagnostics.ErrorScanner(self.early_abort.get('patterns', [])).feed(text + '\n')
+		return line and (step.command, step.name, line)
+	# end function
+
+	def watch_output(self, step, report):
+		# returns a function to scan output as it arrives. on the first fatal error, it
+		# reports it with the output so far, and stops the process if so configured
+		scanner = diagnostics.ErrorScanner(self.early_abort.get('patterns', []))
+		# lines still to wait for after the error, to get its details
+		context = [self.early_abort.get('context', 0)]
+		def on_text(text):
+			if context[0] < 0:
+				return
+			if not step.fatal:
+				step.fatal = scanner.feed(text)
+				if not step.fatal:
+					return
+				text = scanner.rest
+			# end if
+			context[0] -= text.count('\n')
+			if context[0] > 0:
+				return
+			context[0] = -1
+			line = step.fatal
+			if self.on_fatal and report is not None and not self.fatal_seen:
+				self.fatal_seen = True
+				partial = report.copy()
+				note = KILLED_NOTE if self.policy() == KILL else RUNNING_NOTE
+				self.append_results(step, partial, step.capture.text + note)
+				self.on_fatal((step.command, step.name, line), partial)
+			# end if
+			if self.policy() == KILL:
+				step.aborted = True
+				raise Aborted()
+		# end function
+		return on_text
+	# end function
+
+	def plan(self, command, inputs):
+		# build the dependency graph. returns all steps in topological order,
+		# and the steps of the given command for each input
+		steps = {}
+		roots = self.plan_steps(command, inputs, steps)
+		if len(roots) == 1:
+			# fan-in step
+			roots = roots * len(inputs)
+		# determine distance from the requested command
+		for step in reversed(list(steps.values())):
+			if step in roots:
+				step.depth = 0
+			for dep in step.requires:
+				if dep.depth is None or dep.depth > step.depth + 1:
+					dep.depth = step.depth + 1
+			# end for
+		# end for
+		return list(steps.values()), roots
+	# end function
+
+	def plan_steps(self, command, inputs, steps):
 		cmd = self.config['commands'].get(command)
 		if not cmd:
 			raise Failed("the given command is unknown: %s" % command)
-		
-		# run dependencies if any
+
+		# plan dependencies if any
 		requires = cmd.get('requires')
 		if requires:
-			input = self.execute(requires, input, report, depth+1)
+			deps = self.plan_steps(requires, inputs, steps)
+			if len(deps) == 1:
+				# dependency is a fan-in step
+				deps = deps * len(inputs)
+		else:
+			deps = [None] * len(inputs)
 		# end if
 
-		dirname = os.path.dirname(input)
-		input_rel = os.path.basename(input)
-		[input_rel_noext, ext] = os.path.splitext(input_rel)
-		output_rel = input_rel_noext
-		output = os.path.join(dirname, output_rel)
-		shell_file = os.path.join(dirname, "%s-%s.sh" % (command, input_rel_noext))
-		# create shell file if not existing
-		if not os.path.exists(shell_file):
-			placeholders = {
-				'input': input_rel,
-				'output': output_rel,
-			}
-			shell_cmd = cmd['shell'] % placeholders
-			write_sh(shell_file, shell_cmd)
-		# execute it
-		if report:
-			report.append_file(shell_file, label="%s command" % command)
-
-		# only show output of first command, unless verbose mode is enabled
-		print_all_output = depth == 0 or self.verbose
-		# we need to capture output if a report is requested
-		# or we do not print the output directly (so that we can output it after errors)
-		capture = report is not None or not print_all_output
-		if capture:
-			stdout = subprocess.PIPE
-			stderr = subprocess.STDOUT
+		if cmd.get('fanin'):
+			# a single step processing all inputs
+			step_inputs = [dep.output if dep else input for dep, input in zip(deps, inputs)]
+			step_deps = [dep for dep in deps if dep]
+			planned = [Step(command, cmd, step_inputs, step_deps)]
 		else:
-			stdout = None
-			stderr = None
+			# a step per input
+			step_inputs = [dep.output if dep else input for dep, input in zip(deps, inputs)]
+			# inputs differing only in the extension, like a.c and a.cpp, keep it in their
+			# names, so that their scripts and outputs do not clash
+			stems = {}
+			for input in set(step_inputs):
+				stem = os.path.splitext(input)[0]
+				stems[stem] = stems.get(stem, 0) + 1
+			# end for
+			planned = [Step(command, cmd, [input], [dep] if dep else [],
+				name=step_name(input) if stems[os.path.splitext(input)[0]] > 1 else None)
+				for dep, input in zip(deps, step_inputs)]
 		# end if
 
-		# start process
-		proc = subprocess.Popen('./' + os.path.basename(shell_file), 
-			shell=True, cwd=dirname, stdout=stdout, stderr=stderr)
+		# merge identical steps
+		result = []
+		for step in planned:
+			key = (step.command, tuple(step.inputs))
+			result.append(steps.setdefault(key, step))
+		# end for
+		return result
+	# end function
 
-		if capture:
-			captured_output = ""
-			while True:
-				line = proc.stdout.readline().decode()
-				if not line: break
-				if print_all_output:
-					#utils.console.print(line, end=None)
-					sys.stdout.write(line)
-				captured_output += line
-			# end while
+	def write_script(self, step):
+		# create shell file if not existing. existing ones may have been edited
+		if not os.path.exists(step.shell_file):
+			with trace.span("write script", 'executor', file=step.shell_file):
+				write_sh(step.shell_file, step.cmd['shell'] % step.placeholders)
 		# end if
-		returncode = proc.wait()
-		success = returncode == 0
+	# end function
 
-		if capture:
-			captured_output += proc.stdout.read().decode()			
+	def run_step(self, step, report=None, print_output=True):
+		start = timer()
+		with trace.span("%s %s" % (step.command, step.name), 'step'):
+			cmd = step.cmd
+			command = step.command
+			self.write_script(step)
+			# execute it
+			if report:
+				report.append_file(step.shell_file, label="%s command" % command, kind=COMMAND)
 
-		if report:
-			report.append_block(captured_output, title="%s output" % command, lang='sh')
-			# provide more context on failure
-			#if not success:
+			# look up cached artifacts of previous runs with identical inputs
+			cache_key = None
+			if self.cache and cmd.get('cache'):
+				with trace.span("cache lookup", 'executor'):
+					cache_key = self.cache.key(command, step.inputs, step.shell_file, step.dependencies())
+					cached_output = self.cache.restore(cache_key, step.output)
+			else:
+				cached_output = None
+			# end if
+			if cached_output is not None:
+				returncode = 0
+				captured_output = cached_output
+				if print_output:
+					sys.stdout.write(captured_output)
+			else:
+				# we need to capture output if a report is requested, the result is cached,
+				# or we do not print the output directly (so that we can output it after errors)
+				# workers always need to capture, as their output arrives through a pipe
+				capture = None
+				if report is not None or cache_key is not None or not print_output or self.early_abort \
+						or self.workers:
+					capture = self.create_capture(step, echo=print_output)
+					if self.early_abort:
+						capture.on_text = self.watch_output(step, report)
+				# end if
+				step.capture = capture
+				step.fatal = None
+				step.aborted = False
+				if self.workers:
+					returncode = self.run_on_worker(step, capture)
+				else:
+					returncode = run_sh(step.shell_file, capture, self.running, self.cancellable, step.args)
+				step.capture = None
+				captured_output = capture.text if capture else None
+				if step.aborted:
+					captured_output += KILLED_NOTE
+				if returncode == 0 and cache_key:
+					with trace.span("cache save", 'executor'):
+						self.cache.save(cache_key, step.output, captured_output)
+				# end if
+			# end if
+			step.returncode = returncode
+			step.captured_output = captured_output
+
+			if report:
+				self.append_results(step, report, captured_output)
+
+			# imported here, not to load it at startup
+			from . import metrics
+			metrics.add_step(step.depth, timer() - start)
+			return returncode == 0
+		# end with
+	# end function
+
+	def append_results(self, step, report, captured_output):
+		command = step.command
+		report.append_block(captured_output, title="%s output" % command, lang='sh')
+		# source locations reported by compilers and tracebacks
+		locations = {}
+		if captured_output:
+			locations = diagnostics.locations(captured_output, step.dirname)
+		# provide more context on failure
+		#if not success:
+		for input in step.inputs:
 			try:
-				report.append_file(input, label="%s input" % command)
+				report.append_file(input, label="%s input" % command,
+					lines=locations.pop(os.path.realpath(input), None))
 			except UnicodeDecodeError:
-				# probably a binary file
+				# not detected as binary file
 				pass
-			# end try				
-		# end if
+			# end try
+		# end for
+		# other files of the project mentioned in the output, like headers
+		root = os.path.realpath(step.dirname or '.')
+		for path, lines in locations.items():
+			if path.startswith(root + os.sep):
+				try:
+					report.append_file(os.path.relpath(path), label="%s input" % command, lines=lines)
+				except UnicodeDecodeError:
+					pass
+				# end try
+			# end if
+		# end for
+	# end function
+
+	def run_on_worker(self, step, capture):
+		with trace.span("worker job", 'executor', file=step.shell_file):
+			try:
+				returncode = self.workers.run(step.shell_file, capture.feed, self.running, step.args)
+			except Aborted:
+				# the worker was stopped with the process
+				returncode = -1
+			# end try
+			capture.close()
+			return returncode
+		# end with
+	# end function
 
-		# handle error
-		if not success:
-			if capture:
-				sys.stdout.write(captured_output)
+	def create_capture(self, step, echo):
+		capture_config = self.config.get('capture') or {}
+		spill_file = None
+		if capture_config.get('spill'):
+			spill_file = os.path.join(step.dirname, "%s-%s.log" % (step.command, step.name))
+		return OutputCapture(
+			head=capture_config.get('head', DEFAULT_HEAD),
+			tail=capture_config.get('tail', DEFAULT_TAIL),
+			spill_file=spill_file, echo=echo)
+	# end function
+# end class
 
-			raise Failed("%s failed with errors. Try again with '--autofix' to correct them automatically." % command)
+#-------------------------------------------------------------------------------
+#
+class Step:
+	def __init__(self, command, cmd, inputs, requires, name=None):
+		self.command = command
+		self.cmd = cmd
+		self.inputs = inputs
+		self.requires = requires
+		self.depth = None
+		self.returncode = None
+		self.captured_output = None
+		# capture of the output while running, the first fatal error in it,
+		# and whether the process was stopped because of it
+		self.capture = None
+		self.fatal = None
+		self.aborted = False
 
-		# success
-		return output
+		# derive file names
+		if cmd.get('fanin'):
+			dirs = [os.path.dirname(input) for input in inputs]
+			self.dirname = os.path.commonpath(dirs) if all(dirs) else ''
+			name = os.path.basename(os.path.abspath(self.dirname))
+		else:
+			self.dirname = os.path.dirname(inputs[0])
+			name = name or os.path.splitext(os.path.basename(inputs[0]))[0]
+		# end if
+		self.name = name
+		inputs_rel = [os.path.relpath(input, self.dirname or '.') for input in inputs]
+		output_rel = cmd.get('output', '%(name)s') % { 'name': name }
+		self.output = os.path.join(self.dirname, output_rel)
+		self.shell_file = os.path.join(self.dirname, "%s-%s.sh" % (command, name))
+		# the inputs of fan-in steps are passed when running the script, so that
+		# it stays valid when inputs are added or removed, and keeps any edits
+		self.args = inputs_rel if cmd.get('fanin') else []
+		self.placeholders = {
+			'input': inputs_rel[0],
+			'inputs': '"$@"' if self.args else shlex.quote(inputs_rel[0]),
+			'output': output_rel,
+		}
 	# end function
+
+	def dependencies(self):
+		# other files read by the command, like headers, as given by its watch patterns
+		files = []
+		for pattern in self.cmd.get('watch', []):
+			files += glob.glob(os.path.join(self.dirname, pattern))
+		return sorted(set(files))
+	# end function
+
+	def __repr__(self):
+		return "%s(%s)" % (self.command, ', '.join(self.inputs))
+	# end function
+
 # end class
 
 #-------------------------------------------------------------------------------
 # helpers
 #-------------------------------------------------------------------------------
 #
+#-------------------------------------------------------------------------------
+#
+def step_name(input):
+	# name of a step including the extension of its input, like a_cpp for a.cpp
+	stem, ext = os.path.splitext(os.path.basename(input))
+	return "%s_%s" % (stem, ext[1:]) if ext else stem
+# end function
+
 #-------------------------------------------------------------------------------
 #
 def write_sh(filename, content):
@@ -131,6 +428,44 @@ def write_sh(filename, content):
 	os.chmod(filename, 0o744)
 # end function
 
+#-------------------------------------------------------------------------------
+#
+def run_sh(shell_file, capture=None, running=None, new_session=False, args=()):
+	if capture:
+		stdout = subprocess.PIPE
+		stderr = subprocess.STDOUT
+	else:
+		stdout = None
+		stderr = None
+	# end if
+
+	# start process
+	command = ' '.join(['./' + os.path.basename(shell_file)] + [shlex.quote(arg) for arg in args])
+	with trace.span("process start", 'executor', file=shell_file):
+		proc = subprocess.Popen(command,
+			shell=True, cwd=os.path.dirname(shell_file) or None, stdout=stdout, stderr=stderr,
+			start_new_session=new_session)
+	if running is not None:
+		running.add(proc)
+	try:
+		if capture:
+			with trace.span("capture", 'executor'):
+				try:
+					capture.read_from(proc.stdout)
+				except Aborted:
+					# stop the process with all its children, the output so far suffices
+					utils.kill_process(proc, new_session)
+					capture.close()
+				# end try
+				proc.stdout.close()
+		# end if
+		with trace.span("wait", 'executor'):
+			return proc.wait()
+	finally:
+		if running is not None:
+			running.discard(proc)
+	# end try
+# end function
 
 #-------------------------------------------------------------------------------
 # end of file
@@ -18,50 +18,127 @@ import subprocess
 import sys
 import traceback
 
+from time import perf_counter as timer
+
 from .executor import Executor
 from .report import Report
+from . import trace
 from . import utils
-from .utils import prog, Failed
-from .config import config
-
-from .llm import LLM
+from .utils import Failed
+from .config import get_config
+from .tokens import count_tokens
 
 #-------------------------------------------------------------------------------
 # constants
 #-------------------------------------------------------------------------------
 #
 
+# starts the prompts of further attempts
+RETRY_PROMPT = "This did not solve the problem yet. Below are the new output, " \
+	"and the changes of the files since my previous message.\n"
+
+# asks for full files if patches cannot be applied
+PATCH_FALLBACK = "Your patches for the following files do not match their current content: %s. " \
+	"Reply with the complete files instead, each under a heading '# %s: (full filename)' followed by a code block."
+
 # usage examples shown at end of help description
 USAGE_EXAMPLES = """
 """
 
+#-------------------------------------------------------------------------------
+# classes
+#-------------------------------------------------------------------------------
+#
+class HelpParser(argparse.ArgumentParser):
+	# program info is costly to load, so only do it when printing help
+	def format_help(self):
+		prog = utils.get_prog()
+		self.description = "%s v%s - %s\n  %s" % (prog.name, prog.version, prog.description, prog.website)
+		return super().format_help()
+	# end function
+# end class
+
 #-------------------------------------------------------------------------------
 # main
 #-------------------------------------------------------------------------------
 #
 def main():
 	# parse command line
-	parser = argparse.ArgumentParser(
-		description="%s v%s - %s\n  %s" % (prog.name, prog.version, prog.description, prog.website),
+	parser = HelpParser(
 		epilog="examples:" + USAGE_EXAMPLES,
 		formatter_class=argparse.RawTextHelpFormatter)
 	parser.add_argument('command', nargs='?',
 		help="command to execute, e.g. run or build")
 	parser.add_argument('input', nargs='?',
-		help="path to the input file or directory")
+		help="path to the input file, directory or glob pattern")
 	parser.add_argument('args', nargs='*', 
 		help="program arguments")
 
 	parser.add_argument('-a', '--autofix', action='store_true',
 		help="attempt to fix errors automatically")
+	parser.add_argument('--attempts', type=int, default=1,
+		help="number of autofix attempts before giving up")
+	parser.add_argument('-n', '--candidates', type=int, default=1,
+		help="number of alternative fixes to request and validate in parallel")
+	parser.add_argument('-m', '--model', metavar='SPEC',
+		help="model to use, or cascade of models to try in turn until a fix succeeds,\n"
+			"e.g. 'gpt-4o-mini@openai.com > gpt-4o@openai.com'")
+	parser.add_argument('--fix-format', choices=['patch', 'file'], default='patch',
+		help="let the AI reply with patches (less tokens) or full files")
 	parser.add_argument('--autoimprove', action='store_true',
 		help="let an AI assistant improve the input files")
+	parser.add_argument('--early-abort', action='store_true',
+		help="request a fix as soon as the output shows a fatal error, see early_abort in executor.yml")
 	parser.add_argument('-v', '--verbose', action='store_true',
 		help="print all subprocess output")
+	parser.add_argument('-w', '--watch', action='store_true',
+		help="re-run affected steps whenever input files or scripts change")
+	parser.add_argument('-j', '--jobs', type=int, default=None,
+		help="number of steps to run in parallel when processing multiple inputs")
+	parser.add_argument('--no-cache', action='store_true',
+		help="do not reuse cached build artifacts and AI replies")
+	recording = parser.add_mutually_exclusive_group()
+	recording.add_argument('--record', metavar='FILE',
+		help="record requests to the AI and its replies to FILE")
+	recording.add_argument('--replay', metavar='FILE',
+		help="answer requests to the AI from a recording instead, e.g. for profiling")
+	parser.add_argument('--trace', metavar='FILE',
+		help="write timings as Chrome trace to FILE, to be viewed in ui.perfetto.dev")
+	parser.add_argument('--timings', action='store_true',
+		help="print a summary of where the time was spent")
 
 	# that's all   
-	args = parser.parse_args()
+	args = parser.parse_intermixed_args()
 
+	if args.trace or args.timings:
+		trace.enable()
+	# replayed runs tell nothing about real ones. only runs using the AI are
+	# recorded, as they load the config anyway, so that plain runs start fast
+	uses_ai = args.autofix or args.autoimprove or args.command == 'autoimprove'
+	metrics = None
+	if uses_ai and not args.replay and get_config().metrics.get('enabled'):
+		from . import metrics
+		metrics.start(args.command)
+	# end if
+	try:
+		run(args)
+		if metrics:
+			metrics.finish(True)
+	except (Failed, KeyboardInterrupt):
+		if metrics:
+			metrics.finish(False)
+		raise
+	finally:
+		if args.trace:
+			trace.write(args.trace)
+		if args.timings:
+			trace.print_summary()
+	# end try
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def run(args):
 	# handle API key management
 	# TODO use subparser for this? The problem is that we need some kind of "default subparser"
 	# so that command/input still works without specifying a subcommand
@@ -70,13 +147,22 @@ def main():
 		value = args.args[0] if len(args.args) > 0 else None
 		if not name:
 			raise Failed("please specify name of API key to set/clear")
-		config.set_apikey(name, value)
+		get_config().set_apikey(name, value)
+		return
+	# end if
+	# show or export metrics of previous runs
+	if args.command == 'stats':
+		from . import metrics
+		if args.input:
+			metrics.export(args.input, args.args[0] if args.args else None)
+		else:
+			metrics.print_stats(metrics.load())
 		return
 	# end if
 	if args.command == 'autoimprove':
 		report = Report()
 		report.append_file(args.input, "input file")
-		autoimprove(report)
+		autoimprove(report, args)
 		return
 	# end if
 
@@ -85,43 +171,236 @@ def main():
 
 # end function
 
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Conversation:
+	# a conversation over several attempts. after the first report, only changes are
+	# sent, so that earlier messages stay untouched and form a prefix that providers
+	# can serve from their prompt cache
+	def __init__(self, llm):
+		self.llm = llm
+		# file contents as sent before
+		self.sent = None
+	# end function
+
+	def prompt(self, report):
+		llm = self.llm
+		if self.sent is None:
+			prompt = report.render(llm.token_budget(), llm.model_id)
+			self.sent = {}
+		else:
+			budget = llm.token_budget() - count_tokens(RETRY_PROMPT, llm.model_id)
+			prompt = RETRY_PROMPT + report.delta(self.sent).render(budget, llm.model_id)
+		# end if
+		self.sent.update(report.snapshot())
+		return prompt
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class SpeculativeFix:
+	# a fix requested as soon as the output of a command shows a fatal error, while
+	# the command is still running or being stopped. it is only used if the command
+	# fails with that error, and cancelled otherwise
+	def __init__(self, llm):
+		self.llm = llm
+		self.conversation = None
+		self.error = None
+		self.started = None
+		self.loop = None
+		self.task = None
+		self.thread = None
+		self.reply = None
+		self.exception = None
+	# end function
+
+	def start(self, error, report):
+		# called by the executor with the error and a report of the output so far
+		import asyncio
+		import threading
+		print("\nfatal error, requesting a fix right away: %s" % error[2])
+		self.error = error
+		self.started = timer()
+		self.conversation = Conversation(self.llm)
+		prompt = self.conversation.prompt(report)
+		# the request runs in an event loop of its own, so that it can be cancelled
+		self.loop = asyncio.new_event_loop()
+		self.task = self.loop.create_task(self.llm.achat(prompt))
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+	# end function
+
+	def run(self):
+		try:
+			self.reply = self.loop.run_until_complete(self.task)
+		except BaseException as e:
+			self.exception = e
+		finally:
+			self.loop.close()
+		# end try
+	# end function
+
+	def result(self, error):
+		# the reply if the command failed with the error it was requested for, None otherwise
+		import asyncio
+		if not self.thread:
+			return None
+		if error != self.error:
+			print("the command failed differently, discarding the early fix")
+			self.cancel()
+			return None
+		# end if
+		self.thread.join()
+		if self.exception:
+			if not isinstance(self.exception, asyncio.CancelledError):
+				utils.warn("early fix request failed: %s" % self.exception)
+			return None
+		# end if
+		return self.reply
+	# end function
+
+	def cancel(self):
+		if self.thread:
+			# the loop may have finished meanwhile
+			try:
+				self.loop.call_soon_threadsafe(self.task.cancel)
+			except RuntimeError:
+				pass
+			self.thread.join()
+		# end if
+	# end function
+
+# end class
+
 #-------------------------------------------------------------------------------
 # functions
 #-------------------------------------------------------------------------------
 #
 def execute(args):
-	
+	if not args.input:
+		raise Failed("please specify an input file, directory or glob pattern")
+
 	executor = Executor(utils.from_here("config/executor.yml"), 
-		verbose=args.verbose)
+		verbose=args.verbose, use_cache=not args.no_cache, cancellable=args.watch,
+		early_abort=args.early_abort)
+
+	# process multiple inputs if a directory or pattern is given
+	from .scheduler import expand_inputs
+	inputs = expand_inputs(args.input, executor.config.get('sources', []))
+	if inputs != [args.input]:
+		if args.autoimprove or (args.autofix and args.candidates > 1):
+			raise Failed("autoimprove and candidates are not supported for multiple inputs")
+		if args.watch:
+			raise Failed("watch mode is not supported for multiple inputs")
+		failed = execute_batch(executor, args.command, inputs, args.jobs)
+		if failed and args.autofix:
+			import asyncio
+			failed = asyncio.run(autofix_batch(executor, args, failed))
+		if failed:
+			raise Failed("%d of %d inputs failed" % (len(failed), len(inputs)))
+		return
+	# end if
+
+	if args.watch:
+		if args.autofix or args.autoimprove:
+			raise Failed("autofix and autoimprove are not supported in watch mode")
+		from .watch import Watcher
+		Watcher(executor, args.command, args.input).run()
+		return
+	# end if
 
 	if args.autofix:
-		# with autofix
-		attempts = 0
-		max_attempts = 1
-		while True:
-			report = Report() # TODO keep state over retries?
+		# with autofix. the attempts of each model are one conversation, so that retries
+		# only need to send what changed. further models only if the previous ones failed
+		cascade_models = models(args)
+		# created before timing attempts, loading the backend is no matter of the model
+		llm = create_llm("autofix", args, use_cache=args.candidates == 1, model=cascade_models[0])
+		# with early abort, the first fix is requested as soon as a fatal error shows up
+		speculation = None
+		if executor.early_abort is not None and args.candidates == 1:
+			speculation = SpeculativeFix(llm)
+			executor.on_fatal = speculation.start
+		# end if
+		report = fix_report(args)
+		try:
+			executor.execute(args.command, args.input, report)
+			if speculation:
+				speculation.cancel()
+			print("success!")
+			return
+		except Failed:
+			pass
+		finally:
+			executor.on_fatal = None
+		# end try
+		# fixes of similar errors that succeeded before cost no tokens
+		failure = remembered_failure(args, report)
+		if failure and failure.recall(executor, args.command, args.input):
+			if speculation:
+				speculation.cancel()
+				speculation = None
+			# end if
+			report = fix_report(args)
 			try:
 				executor.execute(args.command, args.input, report)
-				break
+				print("success with a known fix")
+				return
 			except Failed:
-				if attempts < max_attempts:
-					attempts += 1
-					autofix(report)
-				else:
-					raise Failed("autofix did not succeed after %d attempts" % max_attempts)
-				# end if
-			# try
-		# end while
-		if attempts == 0:
-			print("success!")
-		else:
-			print("success after %d autofix attempts" % attempts)
+				pass
+			# end try
 		# end if
+		early_reply = speculation and speculation.result(executor.error)
+		attempts = 0
+		for i, model in enumerate(cascade_models):
+			if i > 0:
+				print("escalating to %s" % model)
+				llm = create_llm("autofix", args, use_cache=args.candidates == 1, model=model)
+			# end if
+			conversation = speculation.conversation if early_reply else Conversation(llm)
+			for _ in range(args.attempts):
+				attempts += 1
+				start = timer()
+				try:
+					if early_reply:
+						# requested while the command was still running
+						start = speculation.started
+						autofix(report, args, conversation, early_reply)
+						early_reply = None
+					elif args.candidates > 1:
+						autofix_candidates(executor, args, report, llm)
+					else:
+						autofix(report, args, conversation)
+				except Failed as e:
+					# no usable reply, give the next model a chance
+					utils.warn(e)
+					record_attempt(args, model, False, start)
+					break
+				# end try
+				# validate the fix
+				report = fix_report(args)
+				try:
+					executor.execute(args.command, args.input, report)
+					record_attempt(args, model, True, start)
+					if failure:
+						failure.remember()
+					print("success after %d autofix attempts" % attempts)
+					return
+				except Failed:
+					record_attempt(args, model, False, start)
+				# end try
+			# end for
+		# end for
+		raise Failed("autofix did not succeed after %d attempts" % attempts)
 	elif args.autoimprove:
 		# with autoimprove
 		report = Report()
+		report.excerpts = False
 		executor.execute(args.command, args.input, report)
-		autoimprove(report)
+		autoimprove(report, args)
 	else:
 		# the boring way
 		executor.execute(args.command, args.input)
@@ -130,38 +409,288 @@ def execute(args):
 
 #-------------------------------------------------------------------------------
 #
-def autofix(report: Report):
-	llm = LLM.create("autofix", "gpt-3.5-turbo@openai.com")
-	utils.print_markdown(report.markdown)	
-	reply = llm.chat(report.markdown)
-	utils.print_markdown(reply)
-	corrected_files = utils.extract_code_blocks(reply, "Corrected file")
+def execute_batch(executor, command, inputs, jobs):
+	from .scheduler import Scheduler, failed_step, PASSED
+	if not inputs:
+		raise Failed("no input files found")
+	start = timer()
+	steps, roots = executor.plan(command, inputs)
+	# inputs belonging to each requested step
+	pending = {}
+	for input, root in zip(inputs, roots):
+		pending.setdefault(root, []).append(input)
+	# end for
+	failed = []
+
+	# report results as soon as they are available
+	def on_done(step):
+		for input in pending.pop(step, []):
+			if step.state == PASSED:
+				print("passed: %s" % input)
+				if executor.verbose and step.captured_output:
+					sys.stdout.write(step.captured_output)
+			else:
+				culprit = failed_step(step)
+				print("FAILED: %s (%s failed)" % (input, culprit.command))
+				if culprit.captured_output:
+					sys.stdout.write(culprit.captured_output)
+				failed.append(input)
+			# end if
+		# end for
+	# end function
+
+	Scheduler(executor, jobs).run(steps, on_done)
+
+	print("%d passed, %d failed in %.2fs" % (len(inputs) - len(failed), len(failed), timer() - start))
+	return failed
+# end function
+
+#-------------------------------------------------------------------------------
+#
+async def autofix_batch(executor, args, inputs):
+	# fixes the given inputs concurrently, as far as the rate limits of the
+	# provider allow. returns the inputs that still fail
+	import asyncio
+	from .llm import registry
+	start = timer()
+	try:
+		results = await asyncio.gather(*(autofix_input(executor, args, input) for input in inputs))
+	finally:
+		# before asyncio.run closes the loop
+		await registry.close_async_clients()
+	# end try
+	failed = [input for input, fixed in zip(inputs, results) if not fixed]
+	print("autofix: %d fixed, %d still failing in %.2fs" % (len(inputs) - len(failed), len(failed), timer() - start))
+	return failed
+# end function
+
+#-------------------------------------------------------------------------------
+#
+async def autofix_input(executor, args, input):
+	import asyncio
+	from . import patch
+	try:
+		# run again for the report, the batch run did not create one
+		report = fix_report(args)
+		fixed = await asyncio.to_thread(execute_quietly, executor, args.command, input, report)
+		failure = None if fixed else remembered_failure(args, report)
+		if failure and await asyncio.to_thread(failure.recall, executor, args.command, input):
+			print("autofix %s: applied a known fix" % input)
+			report = fix_report(args)
+			fixed = await asyncio.to_thread(execute_quietly, executor, args.command, input, report)
+		# end if
+		for model in ([] if fixed else models(args)):
+			conversation = Conversation(create_llm("autofix", args, model=model))
+			for attempt in range(args.attempts):
+				start = timer()
+				reply = await conversation.llm.achat(conversation.prompt(report))
+				files, failed = patch.resolve_files(reply, "Corrected file")
+				if failed:
+					for filename, error in failed:
+						utils.warn("patch for %s does not apply: %s" % (filename, error))
+					reply = await conversation.llm.achat(PATCH_FALLBACK % (
+						', '.join(f for f, _ in failed), "Corrected file"))
+					files += patch.resolve_files(reply, "Corrected file")[0]
+				# end if
+				for filename, content in files:
+					utils.save_file(filename, content)
+				print("autofix %s: %s attempt %d changed %s" % (input, model, attempt + 1,
+					', '.join(f for f, _ in files) or 'nothing'))
+				# validate the fix
+				report = fix_report(args)
+				fixed = await asyncio.to_thread(execute_quietly, executor, args.command, input, report)
+				record_attempt(args, model, fixed, start)
+				if fixed:
+					if failure:
+						failure.remember()
+					break
+			# end for
+			if fixed:
+				break
+		# end for
+	except Exception as e:
+		# any error of a single input, including those of the provider, must not stop the others
+		print("autofix %s: %s" % (input, e))
+		return False
+	# end try
+	print("%s: %s" % ("fixed" if fixed else "NOT FIXED", input))
+	return fixed
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def execute_quietly(executor, command, input, report=None):
+	try:
+		executor.execute(command, input, report, quiet=True)
+		return True
+	except Failed:
+		return False
+	# end try
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def autofix(report: Report, args, conversation=None, reply=None):
+	# pass the conversation returned to continue it in the next attempt.
+	# a reply given was requested with the conversation already
+	conversation = conversation or Conversation(create_llm("autofix", args))
+	if reply is None:
+		prompt = conversation.prompt(report)
+		utils.print_markdown(prompt)
+		reply, corrected_files = stream_files(conversation.llm, prompt, "Corrected file")
+	else:
+		utils.print_markdown(reply)
+		corrected_files = save_files(conversation.llm, reply, "Corrected file")
+	# end if
 	if not corrected_files:
 		print(reply)
 		raise Failed("AI did not correctly generate source code")
-	for filename, content in corrected_files:
-		utils.save_file(filename, content)	
+	return conversation
 # end function
 
 #-------------------------------------------------------------------------------
 #
-def autoimprove(report: Report):
-	llm = LLM.create("autoimprove", "gpt-3.5-turbo@openai.com")
-	utils.print_markdown(report.markdown)	
-	reply = llm.chat(report.markdown)
-	utils.print_markdown(reply)
-	improved_files = utils.extract_code_blocks(reply, "Improved file")
+def autofix_candidates(executor, args, report: Report, llm=None):
+	from . import candidates
+	llm = llm or create_llm("autofix", args, use_cache=False)
+	prompt = report.render(llm.token_budget(), llm.model_id)
+	utils.print_markdown(prompt)
+	replies = llm.chat_candidates(prompt, args.candidates)
+	print("validating %d candidate fixes..." % len(replies))
+	winner = candidates.validate(executor, args.command, args.input, replies, "Corrected file")
+	if not winner:
+		raise Failed("none of the %d candidate fixes succeeded" % len(replies))
+	utils.print_markdown(winner.reply)
+	winner.promote()
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def autoimprove(report: Report, args):
+	llm = create_llm("autoimprove", args)
+	prompt = report.render(llm.token_budget(), llm.model_id)
+	utils.print_markdown(prompt)
+	reply, improved_files = stream_files(llm, prompt, "Improved file")
 	if len(improved_files) > 0:
 		print("Your AI assistant improved the following files:")
-		for filename, content in improved_files:
+		for filename in improved_files:
 			print("  %s" % filename)
-			utils.save_file(filename, content)	
 		# end for
 	else:
 		print("Your AI assistant found nothing to improve")
 	# end if
 # end function				
 
+#-------------------------------------------------------------------------------
+#
+def create_llm(name, args, use_cache=True, model=None):
+	from .llm import LLM
+	# the first model of the cascade, unless given
+	model = model or models(args)[0]
+	if args.replay:
+		model = LLM.split_model(model)[0] + '@replay'
+	# replies from the response cache would be missing in recordings
+	use_cache = use_cache and not (args.no_cache or args.record or args.replay)
+	return LLM.create(name, model, use_cache, preprompt=preprompt_name(name, args),
+		recording=args.record or args.replay)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def models(args):
+	# the models of the cascade, in the order they are expected to succeed fastest
+	from . import cascade
+	return cascade.get_stats().order(cascade.parse(args.model or get_config().model))
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def record_attempt(args, model, fixed, start):
+	from . import cascade
+	from . import metrics
+	metrics.count('attempts')
+	metrics.note('model', model)
+	# replayed replies tell nothing about the model
+	if not args.replay:
+		cascade.get_stats().record(model, fixed, timer() - start)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def remembered_failure(args, report):
+	# the failure of a report, to look up and store fixes. None if the fix
+	# memory is off, replays would otherwise not ask for the replies recorded
+	if args.replay or not get_config().fix_memory.get('enabled'):
+		return None
+	from . import memory
+	return memory.Failure(report)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def fix_report(args):
+	report = Report()
+	# excerpts of large files are only useful if the reply is a patch
+	report.excerpts = args.fix_format == 'patch'
+	return report
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def preprompt_name(name, args):
+	return name + '-patch' if args.fix_format == 'patch' else name
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def stream_files(llm, prompt, label):
+	# shows the reply while it arrives, and writes each file as soon as its
+	# code block is complete. asks for full files where patches do not apply.
+	# returns the reply and the names of the files written
+	from . import blocks
+	from . import patch
+	files = []
+	failed = []
+	def on_block(block_label, filename, content):
+		try:
+			content = patch.resolve_block(block_label, filename, content)
+		except (Failed, OSError) as e:
+			failed.append((filename, str(e)))
+			return
+		# end try
+		utils.save_file(filename, content)
+		files.append(filename)
+	# end function
+	parser = blocks.CodeBlockParser([label, patch.PATCH_LABEL])
+	reply = utils.print_markdown_stream(blocks.tee(llm.chat_stream(prompt), parser, on_block))
+	if failed:
+		for filename, error in failed:
+			utils.warn("patch for %s does not apply: %s" % (filename, error))
+		prompt = PATCH_FALLBACK % (', '.join(f for f, _ in failed), label)
+		parser = blocks.CodeBlockParser([label])
+		utils.print_markdown_stream(blocks.tee(llm.chat_stream(prompt), parser, on_block))
+	# end if
+	return reply, files
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def save_files(llm, reply, label):
+	# like stream_files, for a reply that is already complete
+	from . import patch
+	files, failed = patch.resolve_files(reply, label)
+	for filename, content in files:
+		utils.save_file(filename, content)
+	filenames = [filename for filename, _ in files]
+	if failed:
+		for filename, error in failed:
+			utils.warn("patch for %s does not apply: %s" % (filename, error))
+		prompt = PATCH_FALLBACK % (', '.join(f for f, _ in failed), label)
+		filenames += stream_files(llm, prompt, label)[1]
+	# end if
+	return filenames
+# end function
+
 #-------------------------------------------------------------------------------
 #
 def entry():
@@ -170,10 +699,10 @@ def entry():
 	except Failed as e:
 		utils.error(e)
 	except FileNotFoundError as e:
-		utils.error_console.print(traceback.format_exc().strip())
-		utils.error_console.print("  cwd: %s\n" % os.getcwd())
+		utils.get_console(stderr=True).print(traceback.format_exc().strip())
+		utils.get_console(stderr=True).print("  cwd: %s\n" % os.getcwd())
 	except Exception:
-		utils.error_console.print(traceback.format_exc())
+		utils.get_console(stderr=True).print(traceback.format_exc())
 	# end try
 # end function	
 		
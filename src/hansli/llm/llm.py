@@ -12,10 +12,27 @@
 # imports 
 #-------------------------------------------------------------------------------
 #
+from .. import metrics
+from .. import trace
 from .. import utils
 from ..utils import Failed
+from ..cache import ResponseCache, default_dir
+from ..config import get_config
+from ..context import FULL
+from . import registry
+from ..tokens import context_window, count_tokens, REPLY_RESERVE
 
-import importlib
+import asyncio
+import concurrent.futures
+
+from time import perf_counter as timer
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+SUMMARY_PROMPT = "Summarize the following conversation concisely. " \
+	"Keep facts, decisions, file names and code that later messages may refer to."
 
 #-------------------------------------------------------------------------------
 # class definition
@@ -26,26 +43,254 @@ class LLM:
 	def __init__(self, name, model):
 		self.name = name
 		self.model = model
+		self.model_id = LLM.split_model(model)[0]
+		# cache for replies to identical conversations
+		self.cache = None
+		# prompt tokens the context strategy left out of the last request
+		self.tokens_saved = 0
 	# end function
 
 	def add_prepromt(self, msg):
-		utils.abstract()
+		raise NotImplementedError("%s does not support preprompts" % type(self).__name__)
+
+	def with_recording(self, recording):
+		# records all requests and replies, so that they can be replayed later
+		from .recording import Recorder
+		return Recorder(self, recording)
+	# end function
+
+	def complete(self, messages):
+		# returns the reply message and the token usage
+		raise NotImplementedError("%s does not implement complete()" % type(self).__name__)
+
+	def complete_stream(self, messages):
+		# yields the reply in chunks, returns the reply message and the token usage.
+		# backends without streaming support deliver the reply at once
+		reply, usage = self.complete(messages)
+		yield reply['content']
+		return reply, usage
+	# end function
+
+	def complete_candidates(self, messages, n):
+		# returns n alternative reply messages and the total token usage.
+		# backends without native support issue separate requests concurrently
+		with concurrent.futures.ThreadPoolExecutor(max_workers=n) as pool:
+			results = list(pool.map(lambda _: self.complete(messages), range(n)))
+		usage = { k: sum(u.get(k, 0) for _, u in results) for k in results[0][1] }
+		return [reply for reply, _ in results], usage
+	# end function
+
+	async def acomplete(self, messages):
+		# backends without async support run the blocking call in a thread
+		return await asyncio.to_thread(self.complete, messages)
+	# end function
+
+	def is_transient(self, error):
+		# whether a failed request may succeed when retried
+		return False
+	# end function
+
+	def retry_after(self, error):
+		# seconds to wait before retrying as requested by the provider, if any
+		return None
+	# end function
 
 	def chat(self, msg):
-		utils.abstract()
+		messages, key, cached = self.prepare(msg)
+		if cached:
+			reply, usage = cached
+		else:
+			# call API
+			with trace.span("llm request", 'llm', model=self.model_id) as span:
+				start = timer()
+				try:
+					reply, usage = self.complete(messages)
+				except BaseException:
+					self.discard_prompt()
+					raise
+				# end try
+				self.trace_usage(span, start, usage, self.tokens_saved)
+			# end with
+		# end if
+		self.finish(key, cached, reply, usage)
+		return reply['content']
+	# end function
+
+	def chat_stream(self, msg):
+		# yields the reply in chunks as they arrive
+		messages, key, cached = self.prepare(msg)
+		try:
+			if cached:
+				reply, usage = cached
+				yield reply['content']
+			else:
+				# call API
+				with trace.span("llm request", 'llm', model=self.model_id, stream=True) as span:
+					start = timer()
+					reply, usage = yield from trace.first_token(self.complete_stream(messages), span)
+					self.trace_usage(span, start, usage, self.tokens_saved)
+				# end with
+			# end if
+		except BaseException:
+			# failed, or not read to the end
+			self.discard_prompt()
+			raise
+		# end try
+		self.finish(key, cached, reply, usage)
+	# end function
+
+	async def achat(self, msg):
+		# like chat, but many conversations can wait for replies concurrently. requests
+		# are subject to the rate limits of the provider, and retried on transient errors
+		messages, key, cached = self.prepare(msg)
+		if cached:
+			reply, usage = cached
+		else:
+			limiter = registry.limiter(LLM.split_model(self.model)[1])
+			estimate = sum(count_tokens(m['content'], self.model_id) for m in messages)
+			with trace.span("llm request", 'llm', model=self.model_id) as span:
+				start = timer()
+				try:
+					reply, usage = await limiter.run(lambda: self.acomplete(messages), estimate, self)
+				except BaseException:
+					# a failed or cancelled request leaves no trace in the conversation
+					self.discard_prompt()
+					raise
+				# end try
+				self.trace_usage(span, start, usage, self.tokens_saved)
+			# end with
+		# end if
+		self.finish(key, cached, reply, usage)
+		return reply['content']
+	# end function
+
+	def chat_candidates(self, msg, n):
+		# returns n alternative replies. they are never cached,
+		# as their purpose is to get different answers
+		self.ctx.messages.append({ 'role': 'user', 'content': msg })
+		try:
+			messages = self.prompt_messages()
+			with trace.span("llm request", 'llm', model=self.model_id, candidates=n) as span:
+				start = timer()
+				replies, usage = self.complete_candidates(messages, n)
+				self.trace_usage(span, start, usage, self.tokens_saved)
+			# end with
+		except BaseException:
+			self.discard_prompt()
+			raise
+		# end try
+		# keep the first one in the context
+		self.finish(None, None, replies[0], usage)
+		return [reply['content'] for reply in replies]
+	# end function
+
+	def prepare(self, msg):
+		# add prompt to context
+		self.ctx.messages.append({ 'role': 'user', 'content': msg })
+		try:
+			messages = self.prompt_messages()
+			# try cache first
+			if not self.cache:
+				return messages, None, None
+			key = self.cache.key(self.model_id, messages)
+			return messages, key, self.cache.lookup(key)
+		except BaseException:
+			self.discard_prompt()
+			raise
+		# end try
+	# end function
+
+	def prompt_messages(self):
+		# the messages to send, as reduced by the context strategy. summarizing
+		# older turns may ask the model too
+		saved = self.ctx.tokens_saved
+		messages = self.ctx.prompt_messages(self.model_id, self.summarize)
+		self.tokens_saved = self.ctx.tokens_saved - saved
+		return messages
+	# end function
+
+	def discard_prompt(self):
+		# removes the prompt added by prepare when no reply follows, so that
+		# the conversation does not continue with two user messages in a row
+		self.ctx.messages.pop()
+	# end function
+
+	def summarize(self, summary, messages):
+		# condense older turns of the conversation
+		text = "".join("%s: %s\n\n" % (m['role'], m['content']) for m in messages)
+		if summary:
+			text = "Previous summary:\n%s\n\nNew messages:\n%s" % (summary, text)
+		with trace.span("llm summarize", 'llm', model=self.model_id) as span:
+			start = timer()
+			reply, usage = self.complete([
+				{ 'role': 'system', 'content': SUMMARY_PROMPT },
+				{ 'role': 'user', 'content': text },
+			])
+			self.trace_usage(span, start, usage)
+		# end with
+		self.ctx.tokens_input += usage['prompt_tokens']
+		self.ctx.tokens_output += usage['completion_tokens']
+		self.ctx.tokens_total += usage['total_tokens']
+		return reply['content']
+	# end function
+
+	def finish(self, key, cached, reply, usage):
+		if cached:
+			self.ctx.cache_hits += 1
+			self.ctx.tokens_cached += usage['total_tokens']
+		else:
+			if key:
+				self.cache.save(key, reply, usage)
+			# update statistics
+			self.ctx.tokens_input += usage['prompt_tokens']
+			self.ctx.tokens_output += usage['completion_tokens']
+			self.ctx.tokens_total += usage['total_tokens']
+			self.ctx.tokens_prefix_cached += usage.get('cached_tokens', 0)
+		# end if
+		# update context
+		self.ctx.messages.append(reply)
+	# end function
+
+	def trace_usage(self, span, start, usage, saved=0):
+		# saved: prompt tokens the context strategy left out of the request
+		elapsed = timer() - start
+		metrics.add_request(self.model, elapsed, usage, saved)
+		span.set(prompt_tokens=usage['prompt_tokens'], completion_tokens=usage['completion_tokens'],
+			tokens_saved=saved,
+			tokens_per_s=round(usage['completion_tokens'] / elapsed, 1) if elapsed > 0 else None)
+	# end function
+
+	def token_budget(self):
+		# tokens available for the next prompt
+		used = self.ctx.history_tokens(self.model_id)
+		return context_window(self.model_id) - REPLY_RESERVE - used
+	# end function
 
 	@staticmethod
-	def create(name, model):
-		# derive module name from model name
-		api = LLM.split_model(model)[1]
-		api_suffix = api.split('.')[0]
-		# import module
-		mod = importlib.import_module('.llm_%s' % api_suffix, __package__)
-		# create subclass
-		llm = mod.create(name, model)
-		# load preprompt from file
-		preprompt = utils.load_file(utils.from_here('preprompts/' + name + '.md'))
-		llm.add_prepromt(preprompt)
+	def create(name, model, use_cache=True, preprompt=None, recording=None):
+		with trace.span("llm setup", 'llm', model=model):
+			# derive module name from model name
+			api = LLM.split_model(model)[1]
+			api_suffix = api.split('.')[0]
+			# import module
+			mod = registry.backend(api_suffix)
+			# create subclass
+			llm = mod.create(name, model)
+			if recording:
+				llm = llm.with_recording(registry.recording(recording))
+			# load preprompt from file
+			llm.add_prepromt(registry.preprompt(preprompt or name))
+			# limit the context sent with each request
+			settings = get_config().context
+			llm.ctx.set_strategy(settings.get('strategy', FULL), settings.get('max_tokens'))
+			# enable response cache
+			if use_cache:
+				settings = get_config().llm_cache
+				llm.cache = ResponseCache(settings.get('dir') or default_dir('responses'),
+					utils.parse_size(settings.get('max_size', '64M')),
+					settings.get('ttl'))
+			# end if
+		# end with
 		# done
 		return llm
 	# end function
@@ -1,11 +1,14 @@
 from ..context import Context
-from ..config import config
+from ..config import get_config
 from .. import utils
 from ..utils import Failed
+from ..tokens import count_tokens
 
 from .llm import LLM
+from . import registry
 
-from openai import OpenAI
+import openai
+from openai import OpenAI, AsyncOpenAI
 
 # factory function
 def create(name, model):
@@ -14,42 +17,123 @@ def create(name, model):
 class LLM_OpenAI(LLM):
 	def __init__(self, name, model):
 		super().__init__(name, model)
-		self.model_id = LLM.split_model(model)[0]
 		# read API key from config
-		api_key = config.api_keys.get('openai.com')
+		api_key = get_config().api_keys.get('openai.com')
 		if not api_key:
 			raise Failed("please add API key for 'openai.com' to use model '%s'" % model)
-		# init client
-		self.client = OpenAI(
+		# init client, shared with other instances
+		self.client = registry.client('openai.com', api_key, lambda: OpenAI(
 			api_key=api_key
-		)
+		))
+		self.api_key = api_key
 		self.ctx = Context(name)
 	# end function
 	
 	def add_prepromt(self, msg):
 		self.ctx.messages.append({ 'role': 'system', 'content': msg })
 
-	def chat(self, msg):
-		# add prompt to context
-		self.ctx.messages.append({ 'role': 'user', 'content': msg })
+	def complete(self, messages):
 		# call API
 		completion = self.client.chat.completions.create(
 			model=self.model_id,
-			messages=self.ctx.messages
+			messages=messages
 		)
 		assert len(completion.choices) == 1
 		# get reply
 		reply = completion.choices[0].message
-		# update context
-		self.ctx.messages.append({ 'role': reply.role, 'content': reply.content })
-		# update statistics
-		self.ctx.tokens_input += completion.usage.prompt_tokens
-		self.ctx.tokens_output += completion.usage.completion_tokens
-		self.ctx.tokens_total += completion.usage.total_tokens
-		# done
-		return reply.content
+		usage = get_usage(completion.usage)
+		return { 'role': reply.role, 'content': reply.content }, usage
 	# end function
 
-# end class
+	async def acomplete(self, messages):
+		# retries are left to the rate limiter, which knows about other requests
+		client = registry.async_client('openai.com', self.api_key, lambda: AsyncOpenAI(
+			api_key=self.api_key, max_retries=0
+		))
+		completion = await client.chat.completions.create(
+			model=self.model_id,
+			messages=messages
+		)
+		reply = completion.choices[0].message
+		return { 'role': reply.role, 'content': reply.content }, get_usage(completion.usage)
+	# end function
+
+	def is_transient(self, error):
+		# rate limits, server errors, timeouts and connection problems
+		return isinstance(error, (openai.RateLimitError, openai.InternalServerError,
+			openai.APIConnectionError))
+	# end function
+
+	def retry_after(self, error):
+		try:
+			return float(error.response.headers.get('retry-after'))
+		except (AttributeError, TypeError, ValueError):
+			return None
+	# end function
+
+	def complete_candidates(self, messages, n):
+		# call API
+		completion = self.client.chat.completions.create(
+			model=self.model_id,
+			messages=messages,
+			n=n
+		)
+		replies = [{ 'role': c.message.role, 'content': c.message.content }
+			for c in completion.choices]
+		usage = get_usage(completion.usage)
+		return replies, usage
+	# end function
 
+	def complete_stream(self, messages):
+		# call API
+		stream = self.client.chat.completions.create(
+			model=self.model_id,
+			messages=messages,
+			stream=True,
+			extra_body={ 'stream_options': { 'include_usage': True } },
+		)
+		role = 'assistant'
+		chunks = []
+		usage = None
+		for chunk in stream:
+			if chunk.usage:
+				usage = get_usage(chunk.usage)
+			# end if
+			if not chunk.choices:
+				continue
+			delta = chunk.choices[0].delta
+			if delta.role:
+				role = delta.role
+			if delta.content:
+				chunks.append(delta.content)
+				yield delta.content
+			# end if
+		# end for
+		content = ''.join(chunks)
+		if not usage:
+			# provider did not report usage, estimate it
+			prompt_tokens = sum(count_tokens(m['content'], self.model_id) for m in messages)
+			completion_tokens = count_tokens(content, self.model_id)
+			usage = {
+				'prompt_tokens': prompt_tokens,
+				'completion_tokens': completion_tokens,
+				'total_tokens': prompt_tokens + completion_tokens,
+			}
+		# end if
+		return { 'role': role, 'content': content }, usage
+	# end function
+
+# end class
 
+def get_usage(usage):
+	result = {
+		'prompt_tokens': usage.prompt_tokens,
+		'completion_tokens': usage.completion_tokens,
+		'total_tokens': usage.total_tokens,
+	}
+	# prompt prefix served from the provider's prompt cache
+	details = getattr(usage, 'prompt_tokens_details', None)
+	if details and details.cached_tokens:
+		result['cached_tokens'] = details.cached_tokens
+	return result
+# end function
@@ -0,0 +1,42 @@
+from ..context import Context
+from ..utils import Failed
+
+from .llm import LLM
+
+# factory function
+def create(name, model):
+	return LLM_Replay(name, model)
+
+class LLM_Replay(LLM):
+	# answers requests from a recording, without network access
+	def __init__(self, name, model):
+		super().__init__(name, model)
+		self.recording = None
+		self.ctx = Context(name)
+	# end function
+
+	def add_prepromt(self, msg):
+		self.ctx.messages.append({ 'role': 'system', 'content': msg })
+
+	def with_recording(self, recording):
+		# replay instead of recording again
+		self.recording = recording
+		return self
+	# end function
+
+	def complete(self, messages):
+		return self.replay(messages, 1)
+
+	def complete_candidates(self, messages, n):
+		return self.replay(messages, n)
+
+	def replay(self, messages, n):
+		if not self.recording:
+			raise Failed("model '%s' needs a recording to replay, see --replay" % self.model)
+		entry = self.recording.lookup(self.recording.key(self.model_id, messages, n))
+		if not entry:
+			raise Failed("request not found in recording '%s'" % self.recording.filename)
+		return entry
+	# end function
+
+# end class
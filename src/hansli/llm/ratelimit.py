@@ -0,0 +1,138 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import asyncio
+import random
+import time
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# delays between retries grow exponentially from this, in seconds
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class TokenBucket:
+	# allows a number of units per minute, refilled continuously
+	def __init__(self, per_minute):
+		self.capacity = per_minute
+		self.rate = per_minute / 60.0
+		self.available = float(per_minute)
+		self.updated = time.monotonic()
+	# end function
+
+	def refill(self):
+		now = time.monotonic()
+		self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+		self.updated = now
+	# end function
+
+	async def acquire(self, amount):
+		# more than the capacity could never be granted
+		amount = min(amount, self.capacity)
+		while True:
+			self.refill()
+			if self.available >= amount:
+				self.available -= amount
+				return
+			# end if
+			await asyncio.sleep((amount - self.available) / self.rate)
+		# end while
+	# end function
+
+	def adjust(self, amount):
+		# corrects an estimate once the actual amount is known, may go below zero
+		self.refill()
+		self.available = min(self.capacity, self.available - amount)
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class RateLimiter:
+	# limits concurrent requests to a provider, and requests and tokens per minute.
+	# retries transient errors with jittered exponential backoff
+	def __init__(self, concurrency=8, rpm=None, tpm=None, retries=5):
+		self.concurrency = concurrency
+		self.requests = TokenBucket(rpm) if rpm else None
+		self.tokens = TokenBucket(tpm) if tpm else None
+		self.retries = retries
+		# asyncio primitives belong to an event loop, so create them per loop
+		self.loop = None
+		self.semaphore = None
+		# statistics
+		self.retried = 0
+	# end function
+
+	def get_semaphore(self):
+		loop = asyncio.get_running_loop()
+		if loop is not self.loop:
+			self.loop = loop
+			self.semaphore = asyncio.Semaphore(self.concurrency)
+		# end if
+		return self.semaphore
+	# end function
+
+	async def run(self, request, tokens, llm):
+		# request is a coroutine function returning (reply, usage), tokens the estimated usage
+		attempt = 0
+		while True:
+			async with self.get_semaphore():
+				if self.requests:
+					await self.requests.acquire(1)
+				if self.tokens:
+					await self.tokens.acquire(tokens)
+				try:
+					reply, usage = await request()
+				except Exception as e:
+					if self.tokens:
+						self.tokens.adjust(-tokens)
+					if attempt >= self.retries or not llm.is_transient(e):
+						raise
+					delay = retry_delay(attempt, llm.retry_after(e))
+				else:
+					if self.tokens:
+						self.tokens.adjust(usage['total_tokens'] - tokens)
+					return reply, usage
+				# end try
+			# end with
+			# wait without blocking others
+			attempt += 1
+			self.retried += 1
+			await asyncio.sleep(delay)
+		# end while
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def retry_delay(attempt, retry_after=None):
+	# "full jitter", so that clients failing together do not retry together
+	delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+	if retry_after:
+		delay = max(delay, retry_after)
+	return delay
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
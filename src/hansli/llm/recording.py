@@ -0,0 +1,114 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import json
+import threading
+
+from ..cache import request_key
+from .llm import LLM
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Recording:
+	# requests and their replies, stored as one JSON object per line
+	def __init__(self, filename):
+		self.filename = filename
+		self.lock = threading.Lock()
+		self.entries = {}
+		try:
+			with open(filename, 'r') as inp:
+				for line in inp:
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						# incomplete last line of an interrupted recording
+						break
+					self.entries[entry['key']] = (entry['reply'], entry['usage'])
+				# end for
+			# end with
+		except FileNotFoundError:
+			pass
+	# end function
+
+	def key(self, model_id, messages, n=1):
+		# requests for several candidates have their own replies
+		key = request_key(model_id, messages)
+		return key if n == 1 else "%s-%d" % (key, n)
+	# end function
+
+	def lookup(self, key):
+		return self.entries.get(key)
+	# end function
+
+	def save(self, key, messages, reply, usage):
+		entry = { 'key': key, 'messages': messages, 'reply': reply, 'usage': usage }
+		with self.lock:
+			self.entries[key] = (reply, usage)
+			with open(self.filename, 'a') as out:
+				out.write(json.dumps(entry) + '\n')
+		# end with
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class Recorder(LLM):
+	# passes requests on to another backend and records them
+	def __init__(self, llm, recording):
+		super().__init__(llm.name, llm.model)
+		self.llm = llm
+		self.ctx = llm.ctx
+		self.recording = recording
+	# end function
+
+	def add_prepromt(self, msg):
+		self.llm.add_prepromt(msg)
+
+	def complete(self, messages):
+		reply, usage = self.llm.complete(messages)
+		self.recording.save(self.recording.key(self.model_id, messages), messages, reply, usage)
+		return reply, usage
+	# end function
+
+	def complete_stream(self, messages):
+		reply, usage = yield from self.llm.complete_stream(messages)
+		self.recording.save(self.recording.key(self.model_id, messages), messages, reply, usage)
+		return reply, usage
+	# end function
+
+	async def acomplete(self, messages):
+		reply, usage = await self.llm.acomplete(messages)
+		self.recording.save(self.recording.key(self.model_id, messages), messages, reply, usage)
+		return reply, usage
+	# end function
+
+	def is_transient(self, error):
+		return self.llm.is_transient(error)
+
+	def retry_after(self, error):
+		return self.llm.retry_after(error)
+
+	def complete_candidates(self, messages, n):
+		replies, usage = self.llm.complete_candidates(messages, n)
+		self.recording.save(self.recording.key(self.model_id, messages, n), messages, replies, usage)
+		return replies, usage
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -0,0 +1,168 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import importlib
+import threading
+import weakref
+
+from .. import utils
+from ..config import get_config
+
+#-------------------------------------------------------------------------------
+# globals
+#-------------------------------------------------------------------------------
+#
+# process-wide state shared by all LLM instances
+lock = threading.Lock()
+backends = {}
+clients = {}
+preprompts = {}
+recordings = {}
+limiters = {}
+# async clients per event loop, as their connections cannot be used by others
+async_clients = weakref.WeakKeyDictionary()
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def backend(api_suffix):
+	# backend module for a provider, e.g. 'openai' -> llm_openai
+	with lock:
+		mod = backends.get(api_suffix)
+		if not mod:
+			mod = importlib.import_module('.llm_%s' % api_suffix, __package__)
+			backends[api_suffix] = mod
+		# end if
+		return mod
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def register_backend(api_suffix, mod):
+	with lock:
+		backends[api_suffix] = mod
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def client(provider, api_key, factory):
+	# API clients keep their connection pools alive, so share them
+	with lock:
+		c = clients.get((provider, api_key))
+		if not c:
+			c = factory()
+			clients[(provider, api_key)] = c
+		# end if
+		return c
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def async_client(provider, api_key, factory):
+	import asyncio
+	loop = asyncio.get_running_loop()
+	with lock:
+		clients = async_clients.setdefault(loop, {})
+		c = clients.get((provider, api_key))
+		if not c:
+			c = factory()
+			clients[(provider, api_key)] = c
+		# end if
+		return c
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+#
+async def close_async_clients():
+	# closes the async clients of the running loop. needed before the loop is
+	# closed, as their connections would be closed on a closed loop otherwise
+	import asyncio
+	loop = asyncio.get_running_loop()
+	with lock:
+		clients = async_clients.pop(loop, {})
+	for c in clients.values():
+		close = getattr(c, 'close', None)
+		if close:
+			await close()
+	# end for
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def limiter(provider):
+	# requests of all conversations to a provider count against the same limits
+	from .ratelimit import RateLimiter
+	with lock:
+		l = limiters.get(provider)
+		if not l:
+			settings = get_config().rate_limits
+			settings = settings.get(provider) or settings.get('default') or {}
+			l = RateLimiter(**settings)
+			limiters[provider] = l
+		# end if
+		return l
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def preprompt(name):
+	with lock:
+		text = preprompts.get(name)
+		if text is None:
+			text = utils.load_file(utils.from_here('preprompts/' + name + '.md'))
+			preprompts[name] = text
+		# end if
+		return text
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def recording(filename):
+	# shared, so that all conversations of a session are recorded to the same file
+	from .recording import Recording
+	with lock:
+		r = recordings.get(filename)
+		if not r:
+			r = Recording(filename)
+			recordings[filename] = r
+		# end if
+		return r
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def clear():
+	with lock:
+		for c in clients.values():
+			close = getattr(c, 'close', None)
+			if close:
+				close()
+		# end for
+		clients.clear()
+		preprompts.clear()
+		recordings.clear()
+		limiters.clear()
+		async_clients.clear()
+	# end with
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -0,0 +1,376 @@
+#-------------------------------------------------------------------------------
+#
+#	Fixes that succeeded before, indexed by the error they fixed, so that
+#	common failures can be fixed again without asking a model.
+#
+#	Errors are reduced to signatures without paths, numbers and quoted
+#	identifiers. Similar signatures are found by MinHash over word shingles,
+#	with the hashes split into bands for lookup. Fixes are stored as the
+#	words they changed, so that they also apply to other files.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import difflib
+import functools
+import heapq
+import os
+import random
+import re
+import zlib
+
+from . import metrics
+from . import utils
+from .report import OUTPUT
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# words per shingle
+SHINGLE_SIZE = 3
+
+# hash functions of a signature, and bands of them used for lookup. fixes
+# sharing all hashes of a band are compared, which finds those of errors 60%
+# similar with a chance of about 90%, and those 80% similar almost always
+NUM_HASHES = 64
+BANDS = 16
+
+# estimated similarity from which errors are considered the same
+MIN_SIMILARITY = 0.6
+
+# stored fixes validated for an error at most, in parallel
+MAX_TRIES = 3
+
+# shingles of long outputs are sampled down to those with the lowest
+# hashes, which are the same ones for the same text
+MAX_SHINGLES = 2000
+
+# hash functions are (a * x + b) mod PRIME, with a and b from a fixed
+# seed, so that signatures stay comparable between runs
+PRIME = (1 << 61) - 1
+SEED = 0x68616e736c69
+
+# shown as model in the metrics of runs fixed from memory
+MODEL = 'memory'
+
+# replaced before building signatures, in that order
+NORMALIZE = [
+	# compilers and interpreters quote identifiers
+	(re.compile(r"'[^'\n]*'|‘[^’\n]*’|\"[^\"\n]*\"|`[^`'\n]*'"), ' <id> '),
+	# paths and file names. not starting within a word, which would be slow
+	(re.compile(r"(?<![\w.~+/-])(?:[\w.~+-]*/[\w.~+/-]*|[\w-]+\.[a-z]\w{0,4}\b)", re.IGNORECASE), ' <path> '),
+	# line numbers, addresses, counts
+	(re.compile(r"\b(?:0x[0-9a-f]+|\d+)\b", re.IGNORECASE), ' <n> '),
+]
+
+WORD_PATTERN = re.compile(r"<\w+>|\w+")
+
+# words, whitespace and single other characters, the units of stored changes
+TOKEN_PATTERN = re.compile(r"\w+|\s+|[^\w\s]")
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class FixMemory(utils.Persistent):
+	# fixes are only appended, so that storing one does not rewrite the others
+	journaled = ('fixes',)
+
+	def __init__(self, name):
+		super().__init__(name)
+		# { 'signature', 'files': [{ 'role', 'ext', 'name', 'edits' }] }, see Failure
+		self.fixes = []
+		# index of a fix -> [times it worked again, times it did not]
+		self.outcomes = {}
+		self.load()
+		# band -> indices of the fixes having it, not persisted
+		self._bands = {}
+		for i, fix in enumerate(self.fixes):
+			self.index(i, fix['signature'])
+	# end function
+
+	def index(self, i, signature):
+		for key in band_keys(signature):
+			self._bands.setdefault(key, []).append(i)
+	# end function
+
+	def lookup(self, signature):
+		# indices of the fixes of similar errors, the most similar and reliable first
+		found = set()
+		for key in band_keys(signature):
+			found.update(self._bands.get(key, ()))
+		scored = []
+		for i in found:
+			s = similarity(signature, self.fixes[i]['signature'])
+			if s >= MIN_SIMILARITY:
+				worked, failed = self.outcomes.get(str(i), (0, 0))
+				scored.append((-s, failed - worked, i))
+		# end for
+		return [i for _, _, i in sorted(scored)]
+	# end function
+
+	def remember(self, signature, files):
+		# a fix already known for a similar error is not stored again
+		for i in self.lookup(signature):
+			if self.fixes[i]['files'] == files:
+				self.record(i, True)
+				return
+		# end for
+		self.fixes.append({ 'signature': signature, 'files': files })
+		self.index(len(self.fixes) - 1, signature)
+	# end function
+
+	def record(self, i, success):
+		outcome = self.outcomes.setdefault(str(i), [0, 0])
+		outcome[0 if success else 1] += 1
+		self.mark_dirty('outcomes')
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class Failure:
+	# a failed run about to be fixed: the signature of its error, and
+	# the files of its report as they were before any fix
+	def __init__(self, report):
+		# loaded here, as recall may run in several threads at once
+		self.memory = get_memory()
+		self.signature = signature(report)
+		# filename -> (role, content)
+		self.files = {}
+		for s in report.sections:
+			if s.filename and s.kind != OUTPUT:
+				# reports may only hold excerpts
+				try:
+					with open(s.filename, 'r') as inp:
+						self.files[s.filename] = (role(s), inp.read())
+				except (OSError, UnicodeDecodeError):
+					pass
+			# end if
+		# end for
+	# end function
+
+	def recall(self, executor, command, input):
+		# applies the first stored fix of a similar error that makes the command
+		# succeed on a copy of the input directory. returns whether there was one
+		from . import candidates
+		if self.signature is None:
+			return False
+		memory = self.memory
+		tried = []
+		for i in memory.lookup(self.signature):
+			files = resolve(memory.fixes[i], self.files)
+			if files:
+				tried.append(candidates.Candidate(i, None, files))
+			if len(tried) == MAX_TRIES:
+				break
+		# end for
+		if not tried:
+			return False
+		winner = candidates.validate_files(executor, command, input, tried)
+		if not winner:
+			for c in tried:
+				memory.record(c.index, False)
+			return False
+		# end if
+		memory.record(winner.index, True)
+		winner.promote()
+		metrics.note('model', MODEL)
+		return True
+	# end function
+
+	def remember(self):
+		# stores the changes made to the files since, after they fixed the failure
+		if self.signature is None:
+			return
+		files = []
+		for filename, (file_role, old) in self.files.items():
+			try:
+				with open(filename, 'r') as inp:
+					new = inp.read()
+			except (OSError, UnicodeDecodeError):
+				continue
+			# end try
+			if new != old:
+				files.append({ 'role': file_role, 'ext': utils.file_ext(filename),
+					'name': os.path.basename(filename), 'edits': edits(old, new) })
+			# end if
+		# end for
+		if files:
+			self.memory.remember(self.signature, files)
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=None)
+def get_memory():
+	# singleton, loaded on first use
+	dirname = os.path.join(utils.OsPaths.APPDATA, 'hansli')
+	os.makedirs(dirname, exist_ok=True)
+	return FixMemory(os.path.join(dirname, 'fix_memory'))
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def signature(report):
+	# MinHash of the word shingles of the outputs in the report, None if there are none
+	text = '\n'.join(s.content for s in report.sections if s.kind == OUTPUT)
+	words = WORD_PATTERN.findall(normalize(text))
+	if not words:
+		return None
+	n = min(SHINGLE_SIZE, len(words))
+	hashes = { zlib.crc32(' '.join(words[i:i + n]).encode()) for i in range(len(words) - n + 1) }
+	if len(hashes) > MAX_SHINGLES:
+		hashes = heapq.nsmallest(MAX_SHINGLES, hashes)
+	return [min((a * h + b) % PRIME for h in hashes) for a, b in hash_functions()]
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def normalize(text):
+	for pattern, replacement in NORMALIZE:
+		text = pattern.sub(replacement, text)
+	return text.lower()
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=None)
+def hash_functions():
+	rng = random.Random(SEED)
+	return [(rng.randrange(1, PRIME), rng.randrange(PRIME)) for _ in range(NUM_HASHES)]
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def band_keys(signature):
+	rows = NUM_HASHES // BANDS
+	return [(b,) + tuple(signature[b * rows:(b + 1) * rows]) for b in range(BANDS)]
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def similarity(a, b):
+	# estimated Jaccard similarity of the shingles
+	return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def role(section):
+	# the label of a file in the report, like "build command"
+	label, sep, _ = section.title.partition(': ' + section.filename)
+	return label if sep else ''
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def edits(old, new):
+	# the changes as search/replace pairs of the words changed, in the
+	# order of the file. the lines changed are found first, which is
+	# faster than comparing the words of whole files
+	a = old.splitlines(keepends=True)
+	b = new.splitlines(keepends=True)
+	result = []
+	for i1, i2, j1, j2 in changes(a, b):
+		words_a = TOKEN_PATTERN.findall(''.join(a[i1:i2]))
+		words_b = TOKEN_PATTERN.findall(''.join(b[j1:j2]))
+		spans = changes(words_a, words_b)
+		start = 0
+		for n, (k1, k2, l1, l2) in enumerate(spans):
+			# unchanged words around are added until the change is found only once,
+			# without reaching into the words of the changes before and after
+			end = spans[n + 1][0] if n + 1 < len(spans) else len(words_a)
+			while old.count(''.join(words_a[k1:k2])) > 1 and (k1 > start or k2 < end):
+				if k1 > start:
+					k1, l1 = k1 - 1, l1 - 1
+				if k2 < end:
+					k2, l2 = k2 + 1, l2 + 1
+			# end while
+			result.append([''.join(words_a[k1:k2]), ''.join(words_b[l1:l2])])
+			start = k2
+		# end for
+	# end for
+	return result
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def changes(a, b):
+	# spans (i1, i2, j1, j2) where a[i1:i2] was replaced by b[j1:j2]. spans are
+	# widened to more than whitespace, so that there is something to search for
+	spans = []
+	matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+	for op, i1, i2, j1, j2 in matcher.get_opcodes():
+		if op == 'equal':
+			continue
+		while not ''.join(a[i1:i2]).strip() and (i1 > 0 or i2 < len(a)):
+			if i1 > 0:
+				i1, j1 = i1 - 1, j1 - 1
+			else:
+				i2, j2 = i2 + 1, j2 + 1
+		# end while
+		# spans widened into each other are merged
+		if spans and i1 <= spans[-1][1]:
+			i1, _, j1, _ = spans.pop()
+		spans.append((i1, i2, j1, j2))
+	# end for
+	return spans
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def apply(content, edits):
+	# applies the edits in order, None if one of them does not match exactly
+	pos = 0
+	for search, replace in edits:
+		i = content.find(search, pos)
+		if i < 0:
+			return None
+		content = content[:i] + replace + content[i + len(search):]
+		pos = i + len(replace)
+	# end for
+	return content
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def resolve(fix, files):
+	# the files of a failure changed by a stored fix, as (filename, content), None
+	# if it does not apply. each file is applied to one with the same role, the
+	# one with the same name first
+	result = []
+	for f in fix['files']:
+		used = [filename for filename, _ in result]
+		targets = sorted((filename for filename, (file_role, _) in files.items()
+			if file_role == f['role'] and utils.file_ext(filename) == f['ext'] and filename not in used),
+			key=lambda filename: os.path.basename(filename) != f['name'])
+		for filename in targets:
+			content = apply(files[filename][1], f['edits'])
+			if content is not None:
+				result.append((filename, content))
+				break
+		else:
+			return None
+		# end for
+	# end for
+	return result
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
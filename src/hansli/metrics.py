@@ -0,0 +1,443 @@
+#-------------------------------------------------------------------------------
+#
+#	Records durations, attempts and token usage of each run, to show their
+#	distribution over many runs, or export it to Prometheus or JSON.
+#
+#	Runs are appended to a JSON lines file. Once it grows large, its records
+#	are rolled up into per day aggregates with histograms, which keeps the
+#	store small and percentiles accurate to a few percent.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import json
+import math
+import os
+import time
+
+from . import utils
+from .utils import Failed
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# ratio between the bounds of histogram buckets, a value is at most
+# that much smaller than reported, about 4.5% on average
+GROWTH = 2 ** (1 / 8)
+
+# raw records are rolled up from that size of the log on, in bytes
+ROLLUP_SIZE = 1 << 20
+
+# percentiles shown and exported
+QUANTILES = (0.5, 0.95, 0.99)
+
+# aggregate kinds
+RUN = 'run'
+REQUEST = 'request'
+
+#-------------------------------------------------------------------------------
+# globals
+#-------------------------------------------------------------------------------
+#
+# record of the run in progress, None if not recording
+current = None
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Histogram:
+	# counts of values per bucket, bucket i holding values up to GROWTH ** i
+	def __init__(self, data=None):
+		data = data or {}
+		self.count = data.get('count', 0)
+		self.sum = data.get('sum', 0.0)
+		self.max = data.get('max', 0.0)
+		self.zeros = data.get('zeros', 0)
+		self.buckets = { int(i): n for i, n in data.get('buckets', {}).items() }
+	# end function
+
+	def add(self, value):
+		self.count += 1
+		self.sum += value
+		self.max = max(self.max, value)
+		if value <= 0:
+			self.zeros += 1
+			return
+		# end if
+		i = math.ceil(math.log(value, GROWTH))
+		self.buckets[i] = self.buckets.get(i, 0) + 1
+	# end function
+
+	def merge(self, other):
+		self.count += other.count
+		self.sum += other.sum
+		self.max = max(self.max, other.max)
+		self.zeros += other.zeros
+		for i, n in other.buckets.items():
+			self.buckets[i] = self.buckets.get(i, 0) + n
+	# end function
+
+	def quantile(self, q):
+		# upper bound of the bucket containing the quantile, None if empty
+		if not self.count:
+			return None
+		rank = q * self.count
+		seen = self.zeros
+		if seen >= rank:
+			return 0.0
+		for i in sorted(self.buckets):
+			seen += self.buckets[i]
+			if seen >= rank:
+				return min(GROWTH ** i, self.max)
+		# end for
+		return self.max
+	# end function
+
+	def to_dict(self):
+		return { 'count': self.count, 'sum': self.sum, 'max': self.max, 'zeros': self.zeros,
+			'buckets': { str(i): n for i, n in self.buckets.items() } }
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class Aggregate:
+	# sums and distributions of the runs or requests of a group
+	def __init__(self, data=None):
+		data = data or {}
+		self.counters = dict(data.get('counters', {}))
+		self.histograms = { name: Histogram(h) for name, h in data.get('histograms', {}).items() }
+	# end function
+
+	def add(self, counters, samples):
+		for name, value in counters.items():
+			self.counters[name] = self.counters.get(name, 0) + value
+		for name, value in samples.items():
+			self.histograms.setdefault(name, Histogram()).add(value)
+	# end function
+
+	def merge(self, other):
+		for name, value in other.counters.items():
+			self.counters[name] = self.counters.get(name, 0) + value
+		for name, h in other.histograms.items():
+			self.histograms.setdefault(name, Histogram()).merge(h)
+	# end function
+
+	def to_dict(self):
+		return { 'counters': self.counters,
+			'histograms': { name: h.to_dict() for name, h in self.histograms.items() } }
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def get_dir():
+	return os.path.join(utils.OsPaths.APPDATA, 'hansli', 'metrics')
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def start(command):
+	# starts recording a run. without it, nothing is recorded
+	global current
+	current = { 'time': time.time(), 'command': command, 'model': None, 'attempts': 0,
+		'steps': [], 'requests': [] }
+	current['start'] = time.perf_counter()
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def note(name, value):
+	# sets a value of the current run, like the model used
+	run = current
+	if run is not None:
+		run[name] = value
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def count(name, amount=1):
+	run = current
+	if run is not None:
+		run[name] += amount
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def add_step(depth, seconds):
+	# steps are run in parallel, appending to a list is atomic
+	run = current
+	if run is not None:
+		run['steps'].append((depth, seconds))
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def add_request(model, seconds, usage, saved=0):
+	# model as "model@provider", like the models of runs. saved are the
+	# prompt tokens the context strategy left out
+	run = current
+	if run is not None:
+		run['requests'].append({ 'model': model, 'seconds': round(seconds, 6),
+			'tokens_input': usage['prompt_tokens'], 'tokens_output': usage['completion_tokens'],
+			'tokens_saved': saved })
+	# end if
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def finish(success):
+	# appends the record of the current run to the store
+	global current
+	if current is None:
+		return
+	run, current = current, None
+	steps = run.pop('steps')
+	run['seconds'] = round(time.perf_counter() - run.pop('start'), 6)
+	# the requested command, and the commands it requires
+	run['run_seconds'] = round(sum(s for depth, s in steps if depth == 0), 6)
+	run['build_seconds'] = round(sum(s for depth, s in steps if depth), 6)
+	run['success'] = success
+	dirname = get_dir()
+	os.makedirs(dirname, exist_ok=True)
+	filename = os.path.join(dirname, 'runs.jsonl')
+	# a single write of a line is not interleaved with those of other processes
+	with open(filename, 'a') as out:
+		out.write(json.dumps(run) + '\n')
+	if os.path.getsize(filename) >= ROLLUP_SIZE:
+		roll_up()
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def aggregate(runs, groups, day=False):
+	# adds runs to aggregates per (kind, command, model), or per
+	# (day, kind, command, model) for rollups
+	for run in runs:
+		prefix = (time.strftime('%Y-%m-%d', time.localtime(run['time'])),) if day else ()
+		tokens_input = sum(r['tokens_input'] for r in run['requests'])
+		tokens_output = sum(r['tokens_output'] for r in run['requests'])
+		# not recorded by earlier versions
+		tokens_saved = sum(r.get('tokens_saved', 0) for r in run['requests'])
+		samples = { 'seconds': run['seconds'], 'build_seconds': run['build_seconds'],
+			'run_seconds': run['run_seconds'] }
+		if run['requests']:
+			samples['tokens'] = tokens_input + tokens_output
+		groups.setdefault(prefix + (RUN, run['command'], run['model']), Aggregate()).add({
+			'runs': 1, 'successes': 1 if run['success'] else 0, 'attempts': run['attempts'],
+			'tokens_input': tokens_input, 'tokens_output': tokens_output, 'tokens_saved': tokens_saved,
+		}, samples)
+		for r in run['requests']:
+			groups.setdefault(prefix + (REQUEST, None, r['model']), Aggregate()).add({
+				'requests': 1, 'tokens_input': r['tokens_input'], 'tokens_output': r['tokens_output'],
+				'tokens_saved': r.get('tokens_saved', 0),
+			}, { 'seconds': r['seconds'], 'tokens': r['tokens_input'] + r['tokens_output'] })
+		# end for
+	# end for
+	return groups
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def read_runs(filename):
+	try:
+		with open(filename, 'r') as inp:
+			for line in inp:
+				try:
+					yield json.loads(line)
+				except ValueError:
+					# incomplete line of an interrupted write
+					pass
+			# end for
+		# end with
+	except FileNotFoundError:
+		pass
+	# end try
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def read_rollups(filename):
+	try:
+		with open(filename, 'r') as inp:
+			entries = json.load(inp)
+	except FileNotFoundError:
+		return {}
+	return { tuple(e['key']): Aggregate(e) for e in entries }
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def roll_up():
+	# moves the raw records into the daily rollups. the log is renamed first,
+	# so that other processes start a new one meanwhile
+	dirname = get_dir()
+	filename = os.path.join(dirname, 'runs.jsonl')
+	rolling = filename + '.rolling'
+	try:
+		os.replace(filename, rolling)
+	except FileNotFoundError:
+		return
+	rollups_file = os.path.join(dirname, 'rollups.json')
+	rollups = read_rollups(rollups_file)
+	aggregate(read_runs(rolling), rollups, day=True)
+	utils.atomic_write(rollups_file, json.dumps([dict(a.to_dict(), key=list(key))
+		for key, a in sorted(rollups.items(), key=lambda x: tuple(str(k) for k in x[0]))]))
+	os.remove(rolling)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def load():
+	# all runs so far, aggregated per (kind, command, model)
+	dirname = get_dir()
+	groups = {}
+	for key, a in read_rollups(os.path.join(dirname, 'rollups.json')).items():
+		groups.setdefault(key[1:], Aggregate()).merge(a)
+	# records being rolled up by another process are missed
+	aggregate(read_runs(os.path.join(dirname, 'runs.jsonl')), groups)
+	return groups
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def print_stats(groups):
+	def quantiles(h, scale=1, fmt="%8.2f"):
+		return ' '.join(fmt % (h.quantile(q) * scale) if h else "%8s" % '-' for q in QUANTILES)
+	# end function
+	header = ' '.join("%8s" % ("p%g" % (q * 100)) for q in QUANTILES)
+	print("%-12s %-28s %6s %7s %8s  %s  (seconds)" % ("command", "model", "runs", "success",
+		"attempts", header))
+	for (kind, command, model), a in sorted(groups.items(), key=sort_key):
+		if kind == RUN:
+			c = a.counters
+			print("%-12s %-28s %6d %6.0f%% %8d  %s" % (command, model or '-', c['runs'],
+				100.0 * c['successes'] / c['runs'], c['attempts'], quantiles(a.histograms.get('seconds'))))
+	# end for
+	print()
+	print("%-41s %6s %12s %12s %12s  %s  (seconds)" % ("model", "calls", "tokens in", "tokens out",
+		"tokens saved", header))
+	for (kind, command, model), a in sorted(groups.items(), key=sort_key):
+		if kind == REQUEST:
+			c = a.counters
+			print("%-41s %6d %12d %12d %12d  %s" % (model, c['requests'], c['tokens_input'],
+				c['tokens_output'], c.get('tokens_saved', 0), quantiles(a.histograms.get('seconds'))))
+	# end for
+	print()
+	print("%-41s %6s  %s  (tokens per call)" % ("model", "calls", header))
+	for (kind, command, model), a in sorted(groups.items(), key=sort_key):
+		if kind == REQUEST:
+			print("%-41s %6d  %s" % (model, a.counters['requests'],
+				quantiles(a.histograms.get('tokens'), fmt="%8.0f")))
+	# end for
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def to_json(groups):
+	result = []
+	for (kind, command, model), a in sorted(groups.items(), key=sort_key):
+		entry = { 'kind': kind, 'command': command, 'model': model, 'counters': a.counters }
+		for name, h in a.histograms.items():
+			entry[name] = dict({ 'p%g' % (q * 100): h.quantile(q) for q in QUANTILES },
+				count=h.count, sum=h.sum, max=h.max)
+		# end for
+		result.append(entry)
+	# end for
+	return json.dumps({ 'generated': time.time(), 'groups': result }, indent=2) + '\n'
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def to_prometheus(groups):
+	# text exposition format, as read by the textfile collector of node_exporter
+	lines = []
+	def metric(name, type, help, samples):
+		lines.append("# HELP hansli_%s %s" % (name, help))
+		lines.append("# TYPE hansli_%s %s" % (name, type))
+		for suffix, labels, value in samples:
+			lines.append("hansli_%s%s{%s} %s" % (name, suffix,
+				','.join('%s="%s"' % (k, escape(v)) for k, v in labels), repr(float(value))))
+		# end for
+	# end function
+	def summary(h, labels):
+		samples = [('', labels + [('quantile', str(q))], h.quantile(q)) for q in QUANTILES]
+		return samples + [('_sum', labels, h.sum), ('_count', labels, h.count)]
+	# end function
+	runs = [(command, model or '', a) for (kind, command, model), a in sorted(groups.items(), key=sort_key)
+		if kind == RUN]
+	requests = [(model, a) for (kind, command, model), a in sorted(groups.items(), key=sort_key)
+		if kind == REQUEST]
+	metric('runs_total', 'counter', "Runs of a command.",
+		[('', [('command', c), ('model', m)], a.counters['runs']) for c, m, a in runs])
+	metric('run_successes_total', 'counter', "Runs of a command that succeeded.",
+		[('', [('command', c), ('model', m)], a.counters['successes']) for c, m, a in runs])
+	metric('autofix_attempts_total', 'counter', "Autofix attempts.",
+		[('', [('command', c), ('model', m)], a.counters['attempts']) for c, m, a in runs])
+	for name, histogram, help in (
+			('run_duration_seconds', 'seconds', "Duration of runs."),
+			('run_build_seconds', 'build_seconds', "Time spent on the commands required by the command run."),
+			('run_command_seconds', 'run_seconds', "Time spent on the command run itself.")):
+		metric(name, 'summary', help, [s for c, m, a in runs if histogram in a.histograms
+			for s in summary(a.histograms[histogram], [('command', c), ('model', m)])])
+	# end for
+	metric('llm_request_seconds', 'summary', "Latency of requests to a model.",
+		[s for m, a in requests for s in summary(a.histograms['seconds'], [('model', m)])])
+	metric('llm_tokens_total', 'counter', "Tokens sent to and received from a model.",
+		[('', [('model', m), ('direction', d)], a.counters['tokens_' + d]) for m, a in requests
+			for d in ('input', 'output')])
+	metric('llm_tokens_saved_total', 'counter', "Prompt tokens left out by the context strategy.",
+		[('', [('model', m)], a.counters.get('tokens_saved', 0)) for m, a in requests])
+	return '\n'.join(lines) + '\n'
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def export(format, filename=None):
+	groups = load()
+	if format == 'json':
+		text = to_json(groups)
+	elif format == 'prometheus':
+		text = to_prometheus(groups)
+	else:
+		raise Failed("unknown export format: %s, use json or prometheus" % format)
+	# end if
+	if filename:
+		# collectors must never see a partial file
+		utils.atomic_write(filename, text)
+	else:
+		print(text, end='')
+	# end if
+# end function
+
+#-------------------------------------------------------------------------------
+# helpers
+#-------------------------------------------------------------------------------
+#
+def sort_key(item):
+	return tuple(k or '' for k in item[0])
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def escape(value):
+	return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
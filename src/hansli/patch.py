@@ -0,0 +1,194 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import difflib
+import heapq
+import re
+
+from . import blocks
+from . import trace
+from .utils import Failed
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# heading of patched files in replies
+PATCH_LABEL = "Patched file"
+
+# minimum similarity of a fuzzily realigned hunk
+MIN_SIMILARITY = 0.8
+
+# lines most similar to the first and last line of a hunk, around which
+# regions are compared when realigning, and their minimum similarity
+ANCHORS = 8
+MIN_ANCHOR_SIMILARITY = 0.5
+
+# lines a realigned region may have more or less than the hunk
+MAX_SHIFT = 2
+
+HUNK_PATTERN = re.compile(
+	r"^<{5,} SEARCH[^\n]*\n(.*?)^={5,}[ \t]*\n(.*?)^>{5,} REPLACE[^\n]*$",
+	re.DOTALL | re.MULTILINE)
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def parse_hunks(text):
+	# search/replace hunks of a patch
+	hunks = HUNK_PATTERN.findall(text)
+	if not hunks:
+		raise Failed("patch contains no search/replace hunks")
+	return hunks
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def apply_hunks(content, hunks):
+	for search, replace in hunks:
+		content = apply_hunk(content, search, replace)
+	return content
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def apply_hunk(content, search, replace):
+	# exact match
+	if search and search in content:
+		return content.replace(search, replace, 1)
+	if not search.strip():
+		# nothing to search for: append
+		return content + replace
+
+	lines = content.splitlines(keepends=True)
+	search_lines = search.splitlines(keepends=True)
+	# ignore differences in indentation and trailing whitespace
+	stripped = [line.strip() for line in lines]
+	search_stripped = [line.strip() for line in search_lines]
+	n = len(search_lines)
+	for i in range(len(lines) - n + 1):
+		if stripped[i:i + n] == search_stripped:
+			return splice(lines, i, i + n, replace)
+	# end for
+
+	# realign to the most similar region, allowing for a few missing or extra lines.
+	# only regions starting or ending near lines similar to the first or last
+	# line of the hunk are compared, as comparing all would take long in large files
+	best = None
+	best_ratio = MIN_SIMILARITY
+	sizes = range(max(1, n - MAX_SHIFT), n + MAX_SHIFT + 1)
+	marked = [i for i, line in enumerate(search_stripped) if line]
+	first, last = marked[0], marked[-1]
+	regions = set()
+	for i in anchors(stripped, search_stripped[first]):
+		for start in range(i - first - MAX_SHIFT, i - first + MAX_SHIFT + 1):
+			regions.update((start, start + size) for size in sizes)
+	for i in anchors(stripped, search_stripped[last]):
+		for end in range(i + n - last - MAX_SHIFT, i + n - last + MAX_SHIFT + 1):
+			regions.update((end - size, end) for size in sizes)
+	# end for
+	matcher = difflib.SequenceMatcher(autojunk=False)
+	matcher.set_seq2('\n'.join(search_stripped))
+	for start, end in sorted(regions):
+		if start < 0 or end > len(lines):
+			continue
+		matcher.set_seq1('\n'.join(stripped[start:end]))
+		if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+			continue
+		ratio = matcher.ratio()
+		if ratio > best_ratio:
+			best = (start, end)
+			best_ratio = ratio
+	# end for
+	if not best:
+		raise Failed("search text not found: %s" % search.strip().splitlines()[0])
+	return splice(lines, best[0], best[1], replace)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def anchors(lines, line):
+	# indices of the lines most similar to the given one, earlier ones first on ties
+	matcher = difflib.SequenceMatcher(autojunk=False)
+	matcher.set_seq2(line)
+	# the best ones so far, as heap of (ratio, -index)
+	best = []
+	threshold = MIN_ANCHOR_SIMILARITY
+	for i, other in enumerate(lines):
+		matcher.set_seq1(other)
+		# lines that cannot beat the worst of the best ones are skipped cheaply
+		if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+			continue
+		ratio = matcher.ratio()
+		if ratio <= threshold:
+			continue
+		heapq.heappush(best, (ratio, -i))
+		if len(best) > ANCHORS:
+			heapq.heappop(best)
+		if len(best) == ANCHORS:
+			threshold = best[0][0]
+	# end for
+	return [-i for _, i in sorted(best, reverse=True)]
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def splice(lines, start, end, replace):
+	if replace and not replace.endswith('\n') and end < len(lines):
+		replace += '\n'
+	return ''.join(lines[:start]) + replace + ''.join(lines[end:])
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def resolve_block(label, filename, content, original=None):
+	# new content of a file given in full or as patch. patches apply
+	# to the given original content, or the file itself
+	if label != PATCH_LABEL:
+		return content
+	if original is None:
+		with open(filename, 'r') as inp:
+			original = inp.read()
+	# end if
+	with trace.span("apply patch", 'reply', file=filename):
+		return apply_hunks(original, parse_hunks(content))
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def resolve_files(reply, label):
+	# returns the files of a reply, either given in full or as patches,
+	# and the patches that failed to apply as (filename, error) pairs
+	files = []
+	failed = []
+	with trace.span("extract code blocks", 'reply', label=label):
+		parser = blocks.CodeBlockParser([label, PATCH_LABEL])
+		found = parser.feed(reply) + parser.close()
+	# end with
+	# later patches of a file apply to the result of earlier ones
+	latest = {}
+	for block_label, filename, content in found:
+		try:
+			latest[filename] = resolve_block(block_label, filename, content, latest.get(filename))
+			files.append((filename, latest[filename]))
+		except (Failed, OSError) as e:
+			failed.append((filename, str(e)))
+		# end try
+	# end for
+	return files, failed
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -9,37 +9,235 @@
 #-------------------------------------------------------------------------------
 
 #-------------------------------------------------------------------------------
-# imports 
+# imports
 #-------------------------------------------------------------------------------
 #
+import os
+
+from . import diagnostics
+from . import trace
 from . import utils
 from .utils import Failed
+from .tokens import count_tokens
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# section kinds
+COMMAND = 'command'
+OUTPUT = 'output'
+INPUT = 'input'
+
+# default priorities, sections with lower priority are trimmed first.
+# outputs come last, as trimming them keeps their start and end anyway
+PRIORITIES = {
+	COMMAND: 3,
+	INPUT: 2,
+	OUTPUT: 1,
+}
+
+# sections are not trimmed below this number of tokens, but dropped instead
+MIN_SECTION_TOKENS = 64
+
+# files with diagnostics are excerpted from that size on, in bytes
+EXCERPT_MIN_SIZE = 8192
+
+# lines shown before and after each reported location
+EXCERPT_CONTEXT = 10
 
 #-------------------------------------------------------------------------------
 # class definition
+#-------------------------------------------------------------------------------
+#
+class Section:
+	def __init__(self, kind, title, content, lang=None, priority=None, filename=None, excerpt=None):
+		self.kind = kind
+		self.title = title
+		self.content = content
+		self.lang = lang
+		self.priority = PRIORITIES.get(kind, 0) if priority is None else priority
+		self.filename = filename
+		# lines the excerpt of a file was taken around, None if the file is complete
+		self.excerpt = excerpt
+	# end function
+
+	def file_content(self):
+		# the whole file, also if only an excerpt is included
+		if self.excerpt is None:
+			return self.content
+		with open(self.filename, 'r', errors='replace') as inp:
+			return inp.read()
+	# end function
+
+	def render(self, content=None):
+		if content is None:
+			content = self.content
+		return "# %s\n```%s\n%s```\n" % (self.title, self.lang, content)
+	# end function
+
+# end class
+
 #-------------------------------------------------------------------------------
 #
 class Report:
 	def __init__(self):
-		self.markdown = ""
+		self.sections = []
+		self.files = set()
+		# whether to show only the lines around diagnostics of large files.
+		# needs to be off when full files are expected back
+		self.excerpts = True
 	# end function
 
-	def append_block(self, content, title=None, lang=None):
-		self.markdown += "# %s\n```%s\n%s```\n" % (title, lang, content)
-	# end function		
+	@property
+	def markdown(self):
+		return self.render()
+	# end function
 
-	def append_file(self, filename, label=None):
-		with open(filename, 'r') as inp:
-			content = inp.read()
-		title = filename
+	def append_block(self, content, title=None, lang=None, kind=OUTPUT, priority=None):
+		self.sections.append(Section(kind, title, content, lang, priority))
+	# end function
+
+	def append_file(self, filename, label=None, kind=INPUT, priority=None, lines=None):
+		# include each file only once. if lines are given, large files are
+		# reduced to the context around them
+		path = os.path.realpath(filename)
+		if path in self.files:
+			return
+		with trace.span("report append", 'report', file=filename):
+			if diagnostics.is_binary(filename):
+				return
+			title = filename
+			excerpt = None
+			if lines and self.excerpts and os.path.getsize(filename) >= EXCERPT_MIN_SIZE:
+				with diagnostics.LineIndex(filename) as index:
+					content = index.excerpt(lines, EXCERPT_CONTEXT)
+				title += " (excerpt)"
+				excerpt = tuple(sorted(lines))
+			else:
+				with open(filename, 'r') as inp:
+					content = inp.read()
+			# end if
+		# end with
 		if label:
 			title = label + ": " + title
-		self.append_block(content, title=title, lang=utils.file_ext(filename)[1:])	
+		self.sections.append(Section(kind, title, content,
+			utils.file_ext(filename)[1:], priority, filename, excerpt))
+		self.files.add(path)
+	# end function
+
+	def copy(self):
+		# sections are never modified, so they can be shared
+		report = Report()
+		report.sections = list(self.sections)
+		report.files = set(self.files)
+		report.excerpts = self.excerpts
+		return report
+	# end function
+
+	def snapshot(self):
+		# whole contents of the files included, and the lines of those included
+		# as excerpt, to send only changes later
+		return { s.filename: (s.file_content(), s.excerpt) for s in self.sections if s.filename }
+	# end function
+
+	def delta(self, previous):
+		# a report with only what changed since the given snapshot: outputs,
+		# new files, and diffs of the files included before. excerpts around
+		# other lines than before are included again, as they show code not seen yet
+		import difflib
+		delta = Report()
+		delta.excerpts = self.excerpts
+		for s in self.sections:
+			old = previous.get(s.filename) if s.filename else None
+			if old is None:
+				delta.sections.append(s)
+				continue
+			# end if
+			old_content, old_excerpt = old
+			content = s.file_content()
+			if old_content != content:
+				# of the whole files, as excerpts also differ if only their lines moved
+				diff = ''.join(difflib.unified_diff(
+					terminated(old_content).splitlines(keepends=True),
+					terminated(content).splitlines(keepends=True),
+					s.filename, s.filename))
+				title = s.title[:-len(" (excerpt)")] if s.excerpt is not None else s.title
+				delta.sections.append(Section(s.kind, title + " (changes)", diff, 'diff',
+					s.priority, s.filename))
+			# end if
+			if old_excerpt is not None and s.excerpt != old_excerpt:
+				delta.sections.append(s)
+		# end for
+		return delta
+	# end function
+
+	def render(self, budget=None, model=None):
+		with trace.span("report render", 'report', sections=len(self.sections)):
+			contents = [s.content for s in self.sections]
+			if budget is not None:
+				self.fit(contents, budget, model)
+			return ''.join(s.render(c) for s, c in zip(self.sections, contents) if c is not None)
+		# end with
+	# end function
+
+	def fit(self, contents, budget, model):
+		sizes = [count_tokens(s.render(), model) for s in self.sections]
+		excess = sum(sizes) - budget
+		# trim least important sections first, later ones before earlier ones
+		order = sorted(range(len(self.sections)), key=lambda i: (self.sections[i].priority, -i))
+		for i in order:
+			if excess <= 0:
+				break
+			target = sizes[i] - excess
+			if target < MIN_SECTION_TOKENS:
+				contents[i] = None
+				excess -= sizes[i]
+				continue
+			# end if
+			contents[i] = trim(contents[i], target, model)
+			size = count_tokens(self.sections[i].render(contents[i]), model)
+			excess -= sizes[i] - size
+		# end for
 	# end function
 
 # end class
 
+#-------------------------------------------------------------------------------
+# helpers
+#-------------------------------------------------------------------------------
+#
+#-------------------------------------------------------------------------------
+#
+def terminated(text):
+	return text if not text or text.endswith('\n') else text + '\n'
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def trim(content, target, model):
+	# keep lines from start and end, so that both the first error
+	# and the final summary of an output are preserved
+	lines = content.splitlines(keepends=True)
+	head = 0
+	tail = len(lines)
+	size = count_tokens("\n[... 0000000 lines omitted ...]\n", model)
+	while head < tail:
+		# alternate between head and tail
+		from_head = head <= len(lines) - tail
+		line = lines[head] if from_head else lines[tail - 1]
+		size += count_tokens(line, model)
+		if size > target:
+			break
+		if from_head:
+			head += 1
+		else:
+			tail -= 1
+	# end while
+	if head == tail:
+		return content
+	return ''.join(lines[:head]) + "\n[... %d lines omitted ...]\n" % (tail - head) + ''.join(lines[tail:])
+# end function
 
 #-------------------------------------------------------------------------------
 # end of file
-
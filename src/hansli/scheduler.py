@@ -0,0 +1,129 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import glob
+import os
+
+from .utils import Failed
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# step states
+PENDING = 'pending'
+PASSED = 'passed'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Scheduler:
+	def __init__(self, executor, jobs=None):
+		self.executor = executor
+		self.jobs = jobs or os.cpu_count() or 1
+	# end function
+
+	def run(self, steps, on_done=None):
+		# imported here, as it is costly and only needed for batch runs
+		import concurrent.futures
+		# steps must be in topological order, as returned by Executor.plan
+		dependents = { step: [] for step in steps }
+		waiting = {}
+		for step in steps:
+			step.state = PENDING
+			waiting[step] = len(step.requires)
+			for dep in step.requires:
+				dependents[dep].append(step)
+		# end for
+
+		def finish(step, state):
+			step.state = state
+			if on_done:
+				on_done(step)
+			for dependent in dependents[step]:
+				if dependent.state != PENDING:
+					continue
+				if state != PASSED:
+					finish(dependent, SKIPPED)
+				else:
+					waiting[dependent] -= 1
+					if waiting[dependent] == 0:
+						submit(dependent)
+				# end if
+			# end for
+		# end function
+
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+			running = {}
+			def submit(step):
+				running[pool.submit(self.executor.run_step, step, None, False)] = step
+
+			for step in steps:
+				if not step.requires:
+					submit(step)
+			# end for
+			while running:
+				done, _ = concurrent.futures.wait(running,
+					return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					step = running.pop(future)
+					try:
+						success = future.result()
+					except (Failed, OSError) as e:
+						step.captured_output = (step.captured_output or '') + "%s\n" % e
+						success = False
+					# end try
+					finish(step, PASSED if success else FAILED)
+				# end for
+			# end while
+		# end with
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def expand_inputs(input, patterns):
+	# a directory expands to all source files in it, a pattern to its matches
+	if os.path.isdir(input):
+		files = []
+		for pattern in patterns:
+			files += glob.glob(os.path.join(input, '**', pattern), recursive=True)
+	elif any(c in input for c in '*?['):
+		files = glob.glob(input, recursive=True)
+	else:
+		return [input]
+	# end if
+	return sorted(set(files))
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def failed_step(step):
+	# find the step that caused the given one to fail or be skipped
+	if step.state == SKIPPED:
+		for dep in step.requires:
+			if dep.state != PASSED:
+				return failed_step(dep)
+	# end if
+	return step
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
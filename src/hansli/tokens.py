@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import functools
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# context window sizes of known models, in tokens
+CONTEXT_WINDOWS = {
+	'gpt-3.5-turbo': 16385,
+	'gpt-4': 8192,
+	'gpt-4-32k': 32768,
+	'gpt-4-turbo': 128000,
+	'gpt-4-turbo-preview': 128000,
+	'gpt-4o': 128000,
+	'gpt-4o-mini': 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# tokens to keep free for the reply
+REPLY_RESERVE = 4096
+
+# rough estimate if no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def count_tokens(text, model=None):
+	encoding = get_encoding(model)
+	if encoding:
+		return len(encoding.encode(text, disallowed_special=()))
+	return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+	# tiktoken is optional, fall back to estimates if not installed
+	try:
+		import tiktoken
+	except ImportError:
+		return None
+	if model:
+		try:
+			return tiktoken.encoding_for_model(model)
+		except KeyError:
+			pass
+	# end if
+	return tiktoken.get_encoding('cl100k_base')
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def context_window(model):
+	# match longest known prefix, e.g. 'gpt-4-0613' -> 'gpt-4'
+	for name in sorted(CONTEXT_WINDOWS, key=len, reverse=True):
+		if model.startswith(name):
+			return CONTEXT_WINDOWS[name]
+	# end for
+	return DEFAULT_CONTEXT_WINDOW
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
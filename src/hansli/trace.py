@@ -0,0 +1,159 @@
+#-------------------------------------------------------------------------------
+#
+#	Records timing spans of a run. They can be written as Chrome trace,
+#	to be viewed in chrome://tracing or https://ui.perfetto.dev, or
+#	printed as summary table.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import json
+import os
+import threading
+
+from time import perf_counter as timer
+
+#-------------------------------------------------------------------------------
+# globals
+#-------------------------------------------------------------------------------
+#
+# spans are only recorded when enabled, so that instrumentation is free otherwise
+enabled = False
+# completed spans as (name, category, start, end, thread, args)
+spans = []
+# start of the trace, in perf_counter seconds
+origin = timer()
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Span:
+	def __init__(self, name, cat, args):
+		self.name = name
+		self.cat = cat
+		self.args = args
+		self.start = None
+	# end function
+
+	def set(self, **args):
+		# add details known only while the span is running
+		self.args.update(args)
+	# end function
+
+	def __enter__(self):
+		self.start = timer()
+		return self
+	# end function
+
+	def __exit__(self, *exc):
+		# appending to a list is atomic, so no lock needed
+		spans.append((self.name, self.cat, self.start, timer(), threading.get_ident(), self.args))
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class NullSpan:
+	def set(self, **args):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		pass
+
+# end class
+
+NULL_SPAN = NullSpan()
+
+#-------------------------------------------------------------------------------
+# functions
+#-------------------------------------------------------------------------------
+#
+def enable():
+	global enabled
+	enabled = True
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def span(name, cat='hansli', **args):
+	# usage: with trace.span("compile", "executor", input=filename): ...
+	if not enabled:
+		return NULL_SPAN
+	return Span(name, cat, args)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def first_token(stream, span):
+	# passes a stream of chunks through, noting when the first one arrived
+	start = timer()
+	try:
+		chunk = next(stream)
+	except StopIteration as e:
+		return e.value
+	span.set(first_token_ms=round((timer() - start) * 1000, 3))
+	yield chunk
+	return (yield from stream)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def write(filename):
+	# Chrome trace event format, timestamps in microseconds
+	pid = os.getpid()
+	events = [{
+		'name': name, 'cat': cat, 'ph': 'X', 'pid': pid, 'tid': tid,
+		'ts': round((start - origin) * 1e6, 3), 'dur': round((end - start) * 1e6, 3),
+		'args': args,
+	} for name, cat, start, end, tid, args in spans]
+	with open(filename, 'w') as out:
+		json.dump({ 'traceEvents': events, 'displayTimeUnit': 'ms' }, out)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def summary():
+	# per span name: category, count, total and maximum duration, in order of appearance
+	rows = {}
+	for name, cat, start, end, tid, args in spans:
+		row = rows.setdefault(name, [cat, 0, 0.0, 0.0])
+		row[1] += 1
+		row[2] += end - start
+		row[3] = max(row[3], end - start)
+	# end for
+	return rows
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def print_summary(file=None):
+	print("%-32s %-10s %6s %12s %12s" % ("span", "category", "count", "total ms", "max ms"), file=file)
+	for name, (cat, count, total, longest) in summary().items():
+		print("%-32s %-10s %6d %12.3f %12.3f" % (name, cat, count, total * 1000, longest * 1000), file=file)
+	# details of the model calls
+	for name, cat, start, end, tid, args in spans:
+		if cat == 'llm' and args.get('tokens_per_s'):
+			print("%s: first token after %s ms, %d completion tokens, %.1f tokens/s, %d prompt tokens saved" % (
+				name, args.get('first_token_ms', '-'), args['completion_tokens'], args['tokens_per_s'],
+				args.get('tokens_saved', 0)), file=file)
+		# end if
+	# end for
+	print("wall time: %.3f ms" % ((timer() - origin) * 1000), file=file)
+# end function
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -16,22 +16,26 @@
 #
 import atexit
 import collections
+import functools
 import glob
+import json
 import os
 import re
+import shutil
 import signal
 import sys
+import tempfile
+import time
 
 from time import perf_counter as timer
-from importlib.metadata import metadata
 
-import yaml
+from . import trace
 
-from rich.console import Console
-from rich.markdown import Markdown
+# note: yaml, rich and importlib.metadata are imported when first needed,
+# as they dominate the startup time of short runs
 
-console = Console()
-error_console = Console(stderr=True)
+# updates per second when rendering streamed markdown
+STREAM_REFRESH_RATE = 8
 
 #-------------------------------------------------------------------------------
 # classes
@@ -65,33 +69,149 @@ class OsPaths:
 #-------------------------------------------------------------------------------
 #
 class Persistent:
+	# list attributes that are only appended to. new items are written to
+	# a journal instead of rewriting the whole state on every save
+	journaled = ()
+	# rewrite the state file once the journal has that many entries
+	compact_threshold = 1000
+
 	def __init__(self, name):
 		self._name = name
+		self._attrs = []
+		self._dirty = set()
+		# number of list items already persisted, per journaled attribute
+		self._persisted = {}
+		self._generation = None
+		self._journal_entries = 0
+		# attributes loaded or saved so far, as opposed to defaults never changed
+		self._stored = set()
 		# save on normal program termination
 		atexit.register(self.save)
 
+	def __setattr__(self, name, value):
+		if not name.startswith('_'):
+			if name not in self._attrs:
+				self._attrs.append(name)
+			self._dirty.add(name)
+		# end if
+		super().__setattr__(name, value)
+	# end function
+
+	def mark_dirty(self, name):
+		# needed after modifying an attribute in place
+		self._dirty.add(name)
+	# end function
+
 	def load(self):
+		import yaml
 		state = {}
 		try:
 			with open(self.get_filename(), 'r') as inp:
-				state = yaml.safe_load(inp)
+				state = yaml.load(inp, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
 		except FileNotFoundError:
 			pass
+		self._generation = state.pop('_journal', None)
 		for a in self.attrs():
 			if a in state:
 				setattr(self, a, state[a])
-		# end for	
+				self._stored.add(a)
+		# end for
+		# replay changes since the state file was written
+		self._journal_entries = 0
+		if self._generation:
+			try:
+				with open(self.get_journal_filename(), 'rb+') as inp:
+					# end of the entries read so far
+					good = 0
+					for line in inp:
+						try:
+							# a line without newline is incomplete, even if it parses
+							entry = json.loads(line) if line.endswith(b'\n') else None
+						except ValueError:
+							entry = None
+						if not isinstance(entry, dict):
+							# incomplete last line of an interrupted save. cut off, so
+							# that later entries are not appended to it and lost
+							inp.truncate(good)
+							break
+						# end if
+						good += len(line)
+						if 'append' in entry:
+							getattr(self, entry['append']).append(entry['item'])
+						else:
+							for a, value in entry['set'].items():
+								setattr(self, a, value)
+							self._stored.update(entry['set'])
+						# end if
+						self._journal_entries += 1
+					# end for
+				# end with
+			except FileNotFoundError:
+				pass
+		# end if
+		self._persisted = { a: len(getattr(self, a)) for a in self.journaled }
+		self._dirty.clear()
+	# end function
 
 	def save(self):
-		state = { a: getattr(self, a) for a in self.attrs() }
-		with open(self.get_filename(), 'w') as out:
-			yaml.dump(state, out)
+		entries = []
+		for a in self.journaled:
+			items = getattr(self, a)
+			persisted = self._persisted.get(a)
+			if a in self._dirty or persisted is None or len(items) < persisted:
+				# replaced or shortened, cannot be journaled
+				return self.compact()
+			entries += [{ 'append': a, 'item': item } for item in items[persisted:]]
+		# end for
+		changed = { a: getattr(self, a) for a in self._attrs if a in self._dirty }
+		if changed:
+			entries.append({ 'set': changed })
+		if not entries:
+			return
+		if not self._generation or self._journal_entries + len(entries) > self.compact_threshold:
+			return self.compact()
+		with open(self.get_journal_filename(), 'a') as out:
+			out.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+		self._stored.update(changed)
+		self._journal_entries += len(entries)
+		self._persisted = { a: len(getattr(self, a)) for a in self.journaled }
+		self._dirty.clear()
+	# end function
+
+	def compact(self):
+		import yaml
+		# start a new journal, so that a crash can never replay an old one
+		old_journal = self._generation and self.get_journal_filename()
+		self._generation = "%x" % time.time_ns()
+		saved = self.saved_attrs()
+		state = { a: getattr(self, a) for a in saved }
+		state['_journal'] = self._generation
+		atomic_write(self.get_filename(), yaml.dump(state, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper)))
+		if old_journal:
+			try:
+				os.remove(old_journal)
+			except FileNotFoundError:
+				pass
+		# end if
+		self._stored.update(saved)
+		self._journal_entries = 0
+		self._persisted = { a: len(getattr(self, a)) for a in self.journaled }
+		self._dirty.clear()
+	# end function
+
+	def saved_attrs(self):
+		# attributes written to the state file
+		return self.attrs()
+	# end function
 
 	def get_filename(self):
 		return self._name + '.yml'
 
+	def get_journal_filename(self):
+		return "%s.%s.jsonl" % (self._name, self._generation)
+
 	def attrs(self):
-		return [a for a in dir(self) if not a.startswith('_') and not callable(getattr(self, a))]
+		return list(self._attrs)
 # end class
 	
 
@@ -102,6 +222,7 @@ class Persistent:
 def load_file(filename):
 	ext = file_ext(filename).lower()
 	if ext in ['.yml', '.yaml']:
+		import yaml
 		with open(filename, 'r') as inp:
 			return yaml.safe_load(inp)
 	else:
@@ -112,13 +233,35 @@ def load_file(filename):
 # end function
 	
 def save_file(filename, content):
-	with open(filename, 'w') as out:
-		return out.write(content)
+	with trace.span("write file", 'io', file=filename):
+		with open(filename, 'w') as out:
+			return out.write(content)
+	# end with
+
+def atomic_write(filename, content):
+	# write to a temporary file first, so that readers never see partial content
+	fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(filename), dir=os.path.dirname(filename) or None)
+	try:
+		with os.fdopen(fd, 'w') as out:
+			out.write(content)
+		# keep permissions of the file replaced
+		if os.path.exists(filename):
+			shutil.copymode(filename, tmp)
+		os.replace(tmp, filename)
+	except BaseException:
+		os.remove(tmp)
+		raise
+	# end try
+# end function
 
 def extract_code_blocks(markdown_text, label):
-    pattern = fr"# {label}: (.*?)\n```(.*?)\n(.*?)```"
-    matches = re.findall(pattern, markdown_text, re.DOTALL)
-    return [(match[0].strip(), match[2]) for match in matches]
+    # returns (filename, content) of the blocks headed by "# <label>: <filename>"
+    from . import blocks
+    with trace.span("extract code blocks", 'reply', label=label):
+        parser = blocks.CodeBlockParser([label])
+        found = parser.feed(markdown_text) + parser.close()
+        return [(filename, content) for _, filename, content in found]
+    # end with
 # end function
 
 #-------------------------------------------------------------------------------
@@ -127,6 +270,33 @@ def file_ext(filename):
 	return os.path.splitext(filename)[1]
 # end function
 
+#-------------------------------------------------------------------------------
+#
+def parse_size(size):
+	# accepts plain byte counts or strings like '256M'
+	if isinstance(size, int):
+		return size
+	units = { 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30 }
+	s = str(size).strip().upper().rstrip('B')
+	if s and s[-1] in units:
+		return int(float(s[:-1]) * units[s[-1]])
+	return int(s)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def kill_process(proc, group):
+	# with group, also its children. needs the process to be started in a new session
+	try:
+		if group:
+			os.killpg(proc.pid, signal.SIGTERM)
+		else:
+			proc.terminate()
+	except ProcessLookupError:
+		pass
+	# end try
+# end function
+
 #-------------------------------------------------------------------------------
 #
 def from_here(rel_path):
@@ -140,31 +310,82 @@ def from_home(rel_path):
 #-------------------------------------------------------------------------------
 #
 def error(msg):
-	error_console.print("\n[bold red]ERROR[/bold red]: %s" % msg)
+	get_console(stderr=True).print("\n[bold red]ERROR[/bold red]: %s" % msg)
 
 #-------------------------------------------------------------------------------
 #
 def warn(msg):
-	error_console.print("[bold yellow]WARNING[/bold yellow]: %s" % msg)
+	get_console(stderr=True).print("[bold yellow]WARNING[/bold yellow]: %s" % msg)
 
 #-------------------------------------------------------------------------------
 #
 def print_markdown(md):
-	console.print(Markdown(md))
+	with trace.span("print markdown", 'ui'):
+		from rich.markdown import Markdown
+		get_console().print(Markdown(md))
+	# end with
 
 #-------------------------------------------------------------------------------
-# initialization
+#
+def print_markdown_stream(chunks):
+	# render markdown while it arrives, returns the complete text
+	from rich.live import Live
+	from rich.markdown import Markdown
+	parts = []
+	last_update = 0
+	with Live(Markdown(""), console=get_console(), refresh_per_second=STREAM_REFRESH_RATE,
+			vertical_overflow='visible') as live:
+		for chunk in chunks:
+			parts.append(chunk)
+			# re-parsing is expensive, so only do it once per refresh
+			now = timer()
+			if now - last_update >= 1.0 / STREAM_REFRESH_RATE:
+				live.update(Markdown(''.join(parts)))
+				last_update = now
+			# end if
+		# end for
+		text = ''.join(parts)
+		live.update(Markdown(text))
+	# end with
+	return text
+# end function
+
 #-------------------------------------------------------------------------------
 #
-# load program info
-m = metadata("hansli")
-prog = ProgInfo(
-	name         = m['Name'],
-	version      = m['Version'],
-	description  = m['Summary'],
-	website      = m['Project-URL'].split(' ')[-1],
-	bugtracker   = '(unknown)',
-)
+@functools.lru_cache(maxsize=None)
+def get_console(stderr=False):
+	from rich.console import Console
+	return Console(stderr=stderr)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+@functools.lru_cache(maxsize=None)
+def get_prog():
+	# load program info
+	from importlib.metadata import metadata
+	m = metadata("hansli")
+	return ProgInfo(
+		name         = m['Name'],
+		version      = m['Version'],
+		description  = m['Summary'],
+		website      = m['Project-URL'].split(' ')[-1],
+		bugtracker   = '(unknown)',
+	)
+# end function
+
+#-------------------------------------------------------------------------------
+#
+def __getattr__(name):
+	# module attributes created on first access
+	if name == 'console':
+		return get_console()
+	if name == 'error_console':
+		return get_console(stderr=True)
+	if name == 'prog':
+		return get_prog()
+	raise AttributeError("module %r has no attribute %r" % (__name__, name))
+# end function
 
 #-------------------------------------------------------------------------------
 # end of file
@@ -0,0 +1,159 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import os
+import sys
+import threading
+import time
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+# seconds between checks for changes
+POLL_INTERVAL = 0.1
+
+# seconds without further changes before re-running
+DEBOUNCE = 0.3
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Watcher:
+	def __init__(self, executor, command, input):
+		self.executor = executor
+		self.steps, _ = executor.plan(command, [input])
+		# steps that have not succeeded since their files last changed
+		self.pending = set(self.steps)
+		self.worker = None
+		self.cancelled = threading.Event()
+	# end function
+
+	def watched_files(self):
+		# maps watched files to the steps affected by them
+		files = {}
+		for step in self.steps:
+			paths = [step.shell_file]
+			if not step.requires:
+				# outputs of other steps are not watched, as they change on every run
+				paths += step.inputs
+			# the same files as in the cache key, so that a change of them is not
+			# answered by an artifact cached before
+			paths += step.dependencies()
+			for path in paths:
+				files.setdefault(os.path.normpath(path), set()).add(step)
+		# end for
+		return files
+	# end function
+
+	def snapshot(self, files):
+		state = {}
+		for path in files:
+			try:
+				st = os.stat(path)
+				state[path] = (st.st_mtime_ns, st.st_size)
+			except FileNotFoundError:
+				state[path] = None
+		# end for
+		return state
+	# end function
+
+	def invalidate(self, steps):
+		# re-run changed steps and everything depending on them
+		for step in self.steps:
+			if step in steps or any(dep in self.pending for dep in step.requires):
+				self.pending.add(step)
+		# end for
+	# end function
+
+	def start(self):
+		self.cancelled.clear()
+		self.worker = threading.Thread(target=self.run_pending, daemon=True)
+		self.worker.start()
+	# end function
+
+	def stop(self):
+		if self.worker and self.worker.is_alive():
+			self.cancelled.set()
+			self.executor.cancel()
+			self.worker.join()
+		# end if
+	# end function
+
+	def run_pending(self):
+		for step in self.steps:
+			if step not in self.pending:
+				continue
+			if self.cancelled.is_set():
+				return
+			print_output = step.depth == 0 or self.executor.verbose
+			success = self.executor.run_step(step, None, print_output)
+			if self.cancelled.is_set():
+				print("[watch] cancelled")
+				return
+			if not success:
+				if step.captured_output is not None and not print_output:
+					sys.stdout.write(step.captured_output)
+				print("[watch] %s failed, waiting for changes..." % step.command)
+				return
+			# end if
+			self.pending.discard(step)
+		# end for
+		print("[watch] done, waiting for changes...")
+	# end function
+
+	def run(self):
+		# scripts are created before the first snapshot, not to be taken for changes
+		for step in self.steps:
+			self.executor.write_script(step)
+		files = self.watched_files()
+		state = self.snapshot(files)
+		print("[watch] watching %d files, press Ctrl-C to stop" % len(files))
+		self.start()
+		try:
+			while True:
+				time.sleep(POLL_INTERVAL)
+				files = self.watched_files()
+				current = self.snapshot(files)
+				if current == state:
+					continue
+				# stop a run in progress, then wait for the burst of changes to end
+				self.stop()
+				while True:
+					time.sleep(DEBOUNCE)
+					files = self.watched_files()
+					settled = self.snapshot(files)
+					if settled == current:
+						break
+					current = settled
+				# end while
+				changed = [path for path in current if current[path] != state.get(path)]
+				state = current
+				affected = set()
+				for path in changed:
+					affected |= files.get(path, set())
+				self.invalidate(affected)
+				print("[watch] changed: %s" % ', '.join(changed))
+				self.start()
+			# end while
+		except KeyboardInterrupt:
+			self.stop()
+		# end try
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
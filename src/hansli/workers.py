@@ -0,0 +1,197 @@
+#-------------------------------------------------------------------------------
+#
+#	Long-lived shells that run the scripts of steps, so that not every
+#	step needs to start a shell of its own.
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import atexit
+import os
+import shlex
+import subprocess
+import threading
+
+from .capture import CHUNK_SIZE
+from . import utils
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+SHELL = '/bin/sh'
+
+# a job runs in a subshell, so that changes of the working directory and the
+# environment are undone after it. the end of its output is marked by a token
+# followed by the exit code. stdin is the pipe of the protocol, so it must not be read.
+# arguments are set before, as sourced scripts do not get their own
+JOB = "(cd %(dir)s && set -- %(args)s && %(run)s ./%(script)s \"$@\") </dev/null 2>&1; printf '%%s%%d\\n' %(token)s \"$?\"\n"
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class WorkerDied(Exception):
+	def __init__(self, returncode):
+		super().__init__("shell worker died with exit code %s" % returncode)
+		self.returncode = returncode
+	# end function
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class ShellWorker:
+	def __init__(self, new_session=False):
+		self.new_session = new_session
+		# marks the end of a job, not to be mistaken for its output
+		self.token = ('hansli-%s:' % os.urandom(8).hex()).encode()
+		self.proc = subprocess.Popen([SHELL], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT, start_new_session=new_session)
+	# end function
+
+	def run(self, shell_file, on_output, args=()):
+		# runs a script with the given arguments, passing its output on in chunks. returns its exit code
+		with open(shell_file, 'rb') as inp:
+			# scripts for other interpreters cannot be sourced
+			run = 'exec' if inp.read(2) == b'#!' else '.'
+		job = JOB % {
+			'dir': shlex.quote(os.path.dirname(shell_file) or '.'),
+			'run': run,
+			'script': shlex.quote(os.path.basename(shell_file)),
+			'args': ' '.join(shlex.quote(arg) for arg in args),
+			'token': shlex.quote(self.token.decode()),
+		}
+		try:
+			self.proc.stdin.write(job.encode())
+			self.proc.stdin.flush()
+		except OSError:
+			raise WorkerDied(self.proc.wait())
+		# end try
+		fd = self.proc.stdout.fileno()
+		buf = b''
+		while True:
+			data = os.read(fd, CHUNK_SIZE)
+			if not data:
+				raise WorkerDied(self.proc.wait())
+			buf += data
+			pos = buf.find(self.token)
+			if pos >= 0:
+				if pos:
+					on_output(buf[:pos])
+				rest = buf[pos + len(self.token):]
+				while b'\n' not in rest:
+					data = os.read(fd, CHUNK_SIZE)
+					if not data:
+						raise WorkerDied(self.proc.wait())
+					rest += data
+				# end while
+				return int(rest[:rest.index(b'\n')])
+			# end if
+			# keep back what could be the start of the token
+			end = self.partial_token(buf)
+			if end:
+				on_output(buf[:end])
+				buf = buf[end:]
+			# end if
+		# end while
+	# end function
+
+	def partial_token(self, buf):
+		# returns where a beginning of the token at the end of buf starts
+		pos = buf.find(self.token[:1], max(0, len(buf) - len(self.token) + 1))
+		while pos >= 0:
+			if self.token.startswith(buf[pos:]):
+				return pos
+			pos = buf.find(self.token[:1], pos + 1)
+		# end while
+		return len(buf)
+	# end function
+
+	def close(self):
+		# stops the shell and whatever it is running
+		utils.kill_process(self.proc, self.new_session)
+		self.proc.wait()
+		self.proc.stdin.close()
+		self.proc.stdout.close()
+	# end function
+
+	def shutdown(self):
+		# lets an idle shell exit on its own
+		try:
+			self.proc.stdin.close()
+		except OSError:
+			pass
+		self.proc.wait()
+		self.proc.stdout.close()
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class WorkerPool:
+	# idle workers, created as needed. there are never more than steps running at once
+	def __init__(self, new_session=False):
+		self.new_session = new_session
+		self.idle = []
+		self.lock = threading.Lock()
+		atexit.register(self.shutdown)
+	# end function
+
+	def run(self, shell_file, on_output, running=None, args=()):
+		# runs a script on an idle worker, see ShellWorker.run
+		worker = self.acquire()
+		if running is not None:
+			running.add(worker.proc)
+		try:
+			returncode = worker.run(shell_file, on_output, args)
+		except WorkerDied as e:
+			# killed, or the script ended the shell. it is replaced by the next job
+			worker.shutdown()
+			return e.returncode
+		except BaseException:
+			# the job may still be running, so the worker cannot be reused
+			worker.close()
+			raise
+		finally:
+			if running is not None:
+				running.discard(worker.proc)
+		# end try
+		with self.lock:
+			self.idle.append(worker)
+		return returncode
+	# end function
+
+	def acquire(self):
+		while True:
+			with self.lock:
+				worker = self.idle.pop() if self.idle else None
+			if not worker:
+				return ShellWorker(self.new_session)
+			# replace workers that died while idle
+			if worker.proc.poll() is None:
+				return worker
+			worker.shutdown()
+		# end while
+	# end function
+
+	def shutdown(self):
+		with self.lock:
+			idle, self.idle = self.idle, []
+		for worker in idle:
+			worker.shutdown()
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
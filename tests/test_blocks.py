@@ -0,0 +1,121 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import random
+import unittest
+
+from hansli.blocks import CodeBlockParser
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+LABEL = "Corrected file"
+
+REPLY = """The loop ran one step too far.
+
+# Corrected file: `hello.cpp` (fixed loop)
+```cpp
+#include <iostream>
+int main() {
+	for (int i = 0; i < 3; i++) std::cout << i;
+}
+```
+
+An example that is not a file:
+```
+# Corrected file: not_a_file.cpp
+```
+
+# Corrected file: notes.md
+````markdown
+Build with:
+```sh
+g++ hello.cpp
+```
+````
+
+# Corrected file: run.sh
+~~~sh
+echo ```
+~~~
+"""
+
+EXPECTED = [
+	(LABEL, 'hello.cpp', "#include <iostream>\nint main() {\n\tfor (int i = 0; i < 3; i++) std::cout << i;\n}\n"),
+	(LABEL, 'notes.md', "Build with:\n```sh\ng++ hello.cpp\n```\n"),
+	(LABEL, 'run.sh', "echo ```\n"),
+]
+
+#-------------------------------------------------------------------------------
+# helpers
+#-------------------------------------------------------------------------------
+#
+def parse(chunks, labels=(LABEL,)):
+	parser = CodeBlockParser(list(labels))
+	blocks = []
+	for chunk in chunks:
+		blocks += parser.feed(chunk)
+	return blocks + parser.close()
+# end function
+
+#-------------------------------------------------------------------------------
+# tests
+#-------------------------------------------------------------------------------
+#
+class CodeBlockParserTest(unittest.TestCase):
+
+	def test_whole_reply(self):
+		self.assertEqual(parse([REPLY]), EXPECTED)
+	# end function
+
+	def test_split_anywhere(self):
+		# the blocks found must not depend on how the reply arrives
+		for i in range(len(REPLY) + 1):
+			self.assertEqual(parse([REPLY[:i], REPLY[i:]]), EXPECTED, "split at %d" % i)
+		self.assertEqual(parse(REPLY), EXPECTED)
+		rng = random.Random(1)
+		for _ in range(50):
+			cuts = sorted(rng.sample(range(1, len(REPLY)), 12))
+			chunks = [REPLY[a:b] for a, b in zip([0] + cuts, cuts + [len(REPLY)])]
+			self.assertEqual(parse(chunks), EXPECTED)
+		# end for
+	# end function
+
+	def test_nested_fence(self):
+		# a shorter fence inside a longer one is content
+		blocks = parse(["# Corrected file: a.md\n````\n```\nx\n```\n`````\n"])
+		self.assertEqual(blocks, [(LABEL, 'a.md', "```\nx\n```\n")])
+	# end function
+
+	def test_tilde_fence(self):
+		# backticks do not close a tilde fence, nor tildes a backtick fence
+		blocks = parse(["# Corrected file: a.sh\n~~~\n```\n~~~\n# Corrected file: b.sh\n```\n~~~\n```\n"])
+		self.assertEqual(blocks, [(LABEL, 'a.sh', "```\n"), (LABEL, 'b.sh', "~~~\n")])
+	# end function
+
+	def test_truncated_block(self):
+		# a block still open at the end is dropped
+		self.assertEqual(parse(["# Corrected file: a.c\n```c\nint x;\n"]), [])
+	# end function
+
+	def test_labels(self):
+		blocks = parse(["# Patch: a.c\n```\nx\n```\n# Other: b.c\n```\ny\n```\n"], [LABEL, "Patch"])
+		self.assertEqual(blocks, [("Patch", 'a.c', "x\n")])
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -0,0 +1,142 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import os
+import tempfile
+import unittest
+
+from hansli import patch
+from hansli.utils import Failed
+
+#-------------------------------------------------------------------------------
+# constants
+#-------------------------------------------------------------------------------
+#
+SOURCE = """#include <iostream>
+
+int square(int x) {
+	return x + x;
+}
+
+int main() {
+	for (int i = 0; i <= 3; i++) {
+		std::cout << square(i) << std::endl;
+	}
+	return 0;
+}
+"""
+
+#-------------------------------------------------------------------------------
+# helpers
+#-------------------------------------------------------------------------------
+#
+def hunk(search, replace):
+	return "<<<<<<< SEARCH\n%s=======\n%s>>>>>>> REPLACE\n" % (search, replace)
+# end function
+
+#-------------------------------------------------------------------------------
+# tests
+#-------------------------------------------------------------------------------
+#
+class ApplyHunkTest(unittest.TestCase):
+
+	def test_exact(self):
+		result = patch.apply_hunk(SOURCE, "\treturn x + x;\n", "\treturn x * x;\n")
+		self.assertEqual(result, SOURCE.replace("x + x", "x * x"))
+	# end function
+
+	def test_indentation(self):
+		# differences in indentation and trailing whitespace are ignored
+		result = patch.apply_hunk(SOURCE, "  return x + x;  \n", "\treturn x * x;\n")
+		self.assertEqual(result, SOURCE.replace("x + x", "x * x"))
+	# end function
+
+	def test_ambiguous(self):
+		# a search text found more than once applies to the first occurrence
+		content = "a = 1\nb = 2\na = 1\n"
+		self.assertEqual(patch.apply_hunk(content, "a = 1\n", "a = 3\n"), "a = 3\nb = 2\na = 1\n")
+	# end function
+
+	def test_fuzzy(self):
+		# a search text slightly off, like a line the model got wrong, is realigned
+		search = "for (int i = 0; i < 3; i++) {\n\tstd::cout << square(i) << std::endl;\n}\n"
+		replace = "for (int i = 0; i < 3; i++) {\n\tstd::cout << square(i) << '\\n';\n}\n"
+		result = patch.apply_hunk(SOURCE, search, replace)
+		self.assertIn("'\\n'", result)
+		self.assertNotIn("i <= 3", result)
+		self.assertIn("return x + x;", result)
+		self.assertEqual(result.count("for ("), 1)
+	# end function
+
+	def test_fuzzy_missing_line(self):
+		# the hunk lacks a line of the file
+		search = "int main() {\n\tfor (int i = 0; i <= 3; i++) {\n\t\tstd::cout << square(i) << std::endl;\n\treturn 0;\n"
+		replace = "int main() {\n\treturn 1;\n"
+		result = patch.apply_hunk(SOURCE, search, replace)
+		self.assertTrue(result.endswith("}\n\nint main() {\n\treturn 1;\n}\n"), result)
+	# end function
+
+	def test_fuzzy_large(self):
+		# in a large file, the region is found around the lines most similar to the ends of the hunk
+		filler = ''.join("int f%d(int x) { return x + %d; }\n" % (i, i) for i in range(5000))
+		search = "int square(int x) {\n\treturn x + x; // wrong\n}\n"
+		result = patch.apply_hunk(filler + SOURCE, search, "int square(int x) {\n\treturn x * x;\n}\n")
+		self.assertEqual(result, filler + SOURCE.replace("x + x", "x * x"))
+	# end function
+
+	def test_missing(self):
+		# nothing like the hunk in the file
+		with self.assertRaises(Failed):
+			patch.apply_hunk(SOURCE, "void unrelated(double y) {\n\tthrow y;\n}\n", "")
+	# end function
+
+	def test_append(self):
+		self.assertEqual(patch.apply_hunk("a\n", "", "b\n"), "a\nb\n")
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class ResolveFilesTest(unittest.TestCase):
+
+	def test_patches(self):
+		# later patches of a file apply to the result of earlier ones,
+		# and those that do not apply are reported
+		with tempfile.TemporaryDirectory() as tmp:
+			filename = os.path.join(tmp, 'hello.cpp')
+			missing = os.path.join(tmp, 'missing.cpp')
+			with open(filename, 'w') as out:
+				out.write(SOURCE)
+			reply = ''.join("# %s: %s\n```\n%s```\n" % (patch.PATCH_LABEL, f, h) for f, h in [
+				(filename, hunk("\treturn x + x;\n", "\treturn x * x;\n")),
+				(filename, hunk("\treturn x * x;\n", "\treturn x * x * x;\n")),
+				(filename, hunk("void unrelated(double y) {\n", "")),
+				(missing, hunk("a\n", "b\n")),
+			])
+			files, failed = patch.resolve_files(reply, "Corrected file")
+		# end with
+		self.assertEqual(files[-1], (filename, SOURCE.replace("x + x", "x * x * x")))
+		self.assertEqual([f for f, _ in failed], [filename, missing])
+	# end function
+
+	def test_no_hunks(self):
+		with self.assertRaises(Failed):
+			patch.parse_hunks("just some text\n")
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
@@ -0,0 +1,140 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import glob
+import os
+import tempfile
+import unittest
+
+from hansli import utils
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class State(utils.Persistent):
+	journaled = ('items',)
+
+	def __init__(self, name):
+		super().__init__(name)
+		self.items = []
+		self.count = 0
+		self.load()
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class SmallState(State):
+	compact_threshold = 3
+# end class
+
+#-------------------------------------------------------------------------------
+# tests
+#-------------------------------------------------------------------------------
+#
+class PersistentTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.name = os.path.join(self.tmp.name, 'state')
+	# end function
+
+	def tearDown(self):
+		self.tmp.cleanup()
+	# end function
+
+	def journals(self):
+		return glob.glob(self.name + '.*.jsonl')
+	# end function
+
+	def test_journal(self):
+		# appends after the first save go to the journal, not the state file
+		state = State(self.name)
+		state.items.append('a')
+		state.save()
+		with open(state.get_filename()) as inp:
+			written = inp.read()
+		state.items.append('b')
+		state.count = 2
+		state.save()
+		with open(state.get_filename()) as inp:
+			self.assertEqual(inp.read(), written)
+		self.assertEqual(len(self.journals()), 1)
+		loaded = State(self.name)
+		self.assertEqual((loaded.items, loaded.count), (['a', 'b'], 2))
+	# end function
+
+	def test_truncated_line(self):
+		# the incomplete last line of an interrupted save is cut off,
+		# so that entries appended later are not lost with it
+		state = State(self.name)
+		for item in 'ab':
+			state.items.append(item)
+			state.save()
+		# end for
+		with open(state.get_journal_filename(), 'a') as out:
+			out.write('{"append": "items", "it')
+		loaded = State(self.name)
+		self.assertEqual(loaded.items, ['a', 'b'])
+		loaded.items.append('c')
+		loaded.save()
+		self.assertEqual(State(self.name).items, ['a', 'b', 'c'])
+	# end function
+
+	def test_generation_mismatch(self):
+		# a journal of another generation, like one left by a crash during
+		# compaction, is not replayed
+		state = State(self.name)
+		state.items.append('a')
+		state.save()
+		with open("%s.%s.jsonl" % (self.name, 'stale'), 'w') as out:
+			out.write('{"append": "items", "item": "old"}\n')
+		self.assertEqual(State(self.name).items, ['a'])
+	# end function
+
+	def test_compaction(self):
+		# the state file is rewritten once the journal is long enough, and
+		# the old journal removed
+		state = SmallState(self.name)
+		for item in 'abcd':
+			state.items.append(item)
+			state.save()
+		# end for
+		self.assertEqual(len(self.journals()), 1)
+		first = state.get_journal_filename()
+		state.items.append('e')
+		state.save()
+		self.assertFalse(os.path.exists(first))
+		self.assertEqual(self.journals(), [])
+		with open(state.get_filename()) as inp:
+			self.assertIn('- e', inp.read())
+		self.assertEqual(State(self.name).items, list('abcde'))
+	# end function
+
+	def test_shortened(self):
+		# lists not only appended to are written in full
+		state = State(self.name)
+		state.items.extend('ab')
+		state.save()
+		state.items.pop()
+		state.save()
+		self.assertEqual(State(self.name).items, ['a'])
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file
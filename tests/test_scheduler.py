@@ -0,0 +1,120 @@
+#-------------------------------------------------------------------------------
+#
+#	@license
+#	Copyright (c) Daniel Pauli <dapaulid@gmail.com>
+#
+#	This source code is licensed under the MIT license found in the
+#	LICENSE file in the root directory of this source tree.
+#
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# imports
+#-------------------------------------------------------------------------------
+#
+import threading
+import unittest
+
+from hansli.scheduler import Scheduler, failed_step, PASSED, FAILED, SKIPPED
+from hansli.utils import Failed
+
+#-------------------------------------------------------------------------------
+# class definition
+#-------------------------------------------------------------------------------
+#
+class Step:
+	def __init__(self, name, requires=(), result=True):
+		self.name = name
+		self.requires = list(requires)
+		self.result = result
+		self.captured_output = None
+	# end function
+
+	def __repr__(self):
+		return self.name
+	# end function
+# end class
+
+#-------------------------------------------------------------------------------
+#
+class Executor:
+	# runs nothing, but records which steps were run, and checks
+	# that their dependencies passed before
+	def __init__(self):
+		self.ran = []
+		self.lock = threading.Lock()
+	# end function
+
+	def run_step(self, step, report, print_output):
+		assert all(dep.state == PASSED for dep in step.requires), step
+		with self.lock:
+			self.ran.append(step)
+		if isinstance(step.result, Exception):
+			raise step.result
+		return step.result
+	# end function
+# end class
+
+#-------------------------------------------------------------------------------
+# tests
+#-------------------------------------------------------------------------------
+#
+class SchedulerTest(unittest.TestCase):
+
+	def run_steps(self, steps, jobs=4):
+		executor = Executor()
+		done = []
+		Scheduler(executor, jobs).run(steps, done.append)
+		self.assertEqual(sorted(done, key=steps.index), steps)
+		return executor.ran
+	# end function
+
+	def test_all_pass(self):
+		a = Step('compile a')
+		b = Step('compile b')
+		link = Step('link', [a, b])
+		run = Step('run', [link])
+		ran = self.run_steps([a, b, link, run])
+		self.assertEqual(set(ran), { a, b, link, run })
+		self.assertEqual(ran[-2:], [link, run])
+		self.assertTrue(all(s.state == PASSED for s in ran))
+	# end function
+
+	def test_failure_skips_dependents(self):
+		# steps depending on a failed one are skipped, others still run
+		a = Step('compile a', result=False)
+		b = Step('compile b')
+		build_a = Step('build a', [a])
+		run_a = Step('run a', [build_a])
+		run_b = Step('run b', [b])
+		ran = self.run_steps([a, b, build_a, run_a, run_b])
+		self.assertEqual(set(ran), { a, b, run_b })
+		self.assertEqual((a.state, build_a.state, run_a.state), (FAILED, SKIPPED, SKIPPED))
+		self.assertEqual((b.state, run_b.state), (PASSED, PASSED))
+		self.assertIs(failed_step(run_a), a)
+	# end function
+
+	def test_error_fails_step(self):
+		# errors like a missing input fail the step, with the error in its output
+		a = Step('compile a', result=Failed("no such file"))
+		run = Step('run', [a])
+		self.run_steps([a, run])
+		self.assertEqual((a.state, run.state), (FAILED, SKIPPED))
+		self.assertIn("no such file", a.captured_output)
+	# end function
+
+	def test_fan_in(self):
+		# a step requiring several others is skipped if any of them fails
+		a = Step('compile a')
+		b = Step('compile b', result=False)
+		link = Step('link', [a, b])
+		ran = self.run_steps([a, b, link], jobs=1)
+		self.assertNotIn(link, ran)
+		self.assertEqual(link.state, SKIPPED)
+		self.assertIs(failed_step(link), b)
+	# end function
+
+# end class
+
+#-------------------------------------------------------------------------------
+# end of file